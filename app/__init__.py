@@ -16,7 +16,12 @@ def create_app():
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
-    socketio.init_app(app)
+    # with a message queue every worker/node relays the emits of the others
+    socketio.init_app(
+        app,
+        message_queue=app.config.get("SOCKETIO_MESSAGE_QUEUE"),
+        channel=app.config.get("SOCKETIO_CHANNEL", "flask-socketio"),
+    )
     
     xendit.set_api_key(os.getenv("XENDIT_API_KEY"))
     
@@ -38,6 +43,8 @@ def create_app():
     from .models.user_model import User
     from .models.walk_in_model import WalkIn
     from .models.appointment_model import Appointment
+    from .models.appointment_daily_fact_model import AppointmentDailyFact
+    from .models.appointment_fact_state_model import AppointmentFactState
     from .models.service_model import Service
     from .models.voucher_model import Voucher
     from .models.otp_model import OTP
@@ -72,5 +79,16 @@ def create_app():
     
     # Import socket events to register handlers
     from . import socket_events
+    # start the socket publisher from the server's thread, workers publish from their own
+    from .helper.socket_publisher import get_publisher
+    with app.app_context():
+        get_publisher().start()
+    # Import analytics facts to register the appointment flush listener
+    from .helper import analytics_facts
+    # and the one keeping branch/service/aesthetician rating totals
+    from .helper import ratings
+    
+    from .commands import register_commands
+    register_commands(app)
     
     return app
\ No newline at end of file
@@ -0,0 +1,64 @@
+import click
+from flask.cli import with_appcontext
+from .extension import db
+
+
+@click.command("backfill-ratings")
+@with_appcontext
+def backfill_ratings_command():
+    """Rebuild rating_sum/rating_count/average_rate for branches, services and aestheticians"""
+    from .helper.ratings import backfill_ratings
+    from .models.appointment_model import Appointment
+    from .models.branch_model import Branch
+    from .models.service_model import Service
+    from .models.aesthetician_model import Aesthetician
+
+    targets = [
+        ("branch", Branch, Branch.branch_id, Appointment.branch_id, Appointment.branch_rating),
+        ("service", Service, Service.service_id, Appointment.service_id, Appointment.service_rating),
+        ("aesthetician", Aesthetician, Aesthetician.aesthetician_id, Appointment.aesthetician_id, Appointment.aesthetician_rating),
+    ]
+    try:
+        for name, model, id_field, fk_field, rating_field in targets:
+            rated = backfill_ratings(model, id_field, fk_field, rating_field)
+            click.echo(f"{name}: {rated} rated")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+@click.command("rebuild-analytics")
+@with_appcontext
+def rebuild_analytics_command():
+    """Recompute appointment_daily_fact from the appointment table"""
+    from .helper.analytics_facts import rebuild_facts
+
+    try:
+        rows = rebuild_facts()
+        db.session.commit()
+        click.echo(f"appointment_daily_fact: {rows} rows")
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+@click.command("purge-otps")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows deleted per transaction")
+@with_appcontext
+def purge_otps_command(batch_size):
+    """Delete expired OTPs (only the sql OTP_BACKEND keeps any)"""
+    from .helper.otp_store import get_otp_store
+
+    try:
+        deleted = get_otp_store().purge_expired(batch_size=batch_size)
+        click.echo(f"otp: {deleted} expired rows deleted")
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def register_commands(app):
+    app.cli.add_command(backfill_ratings_command)
+    app.cli.add_command(rebuild_analytics_command)
+    app.cli.add_command(purge_otps_command)
@@ -24,4 +24,49 @@ class Config:
     JWT_COOKIE_SAMESITE = "Lax"
     # Token expiration times - 7 days for both access and refresh tokens
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
-    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
\ No newline at end of file
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # bcrypt work factor; existing hashes are upgraded/downgraded on the next successful signin
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    # Seconds an account's resolved identity (role, profile ids, deleted flag) stays cached
+    PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+
+    # Socket.IO pub/sub between workers, e.g. redis://localhost:6379/1 (needs the redis package)
+    # or amqp://... (kombu). Unset keeps emits in-process, enough for a single worker.
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "flask-socketio")
+    # "queued" publishes emits from a background task, "inline" emits on the request thread (tests)
+    SOCKETIO_PUBLISHER = os.getenv("SOCKETIO_PUBLISHER", "queued")
+    # appointment events to the same rooms within this window go out as one batch; 0 sends each at once
+    SOCKETIO_COALESCE_MS = int(os.getenv("SOCKETIO_COALESCE_MS", 100))
+    # frames kept per room for clients that reconnect with last_seq; older gaps need a full resync
+    SOCKETIO_REPLAY_SIZE = int(os.getenv("SOCKETIO_REPLAY_SIZE", 500))
+    # /appointment/changes holds back writes younger than this so late commits aren't skipped
+    APPOINTMENT_CHANGES_LAG_SECONDS = int(os.getenv("APPOINTMENT_CHANGES_LAG_SECONDS", 2))
+
+    # OTPs: "sql" (otp table, purge with `flask purge-otps`), "memory" (single node) or "cache" (shared CACHE_URL)
+    OTP_BACKEND = os.getenv("OTP_BACKEND", "sql")
+    OTP_TTL_MINUTES = int(os.getenv("OTP_TTL_MINUTES", 5))
+    # wrong codes allowed before the OTP is locked and a new one must be requested
+    OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", 5))
+    # token buckets for issuing OTPs: BURST requests at once, one more every REFILL_SECONDS
+    OTP_EMAIL_BURST = int(os.getenv("OTP_EMAIL_BURST", 3))
+    OTP_EMAIL_REFILL_SECONDS = int(os.getenv("OTP_EMAIL_REFILL_SECONDS", 60))
+    OTP_IP_BURST = int(os.getenv("OTP_IP_BURST", 10))
+    OTP_IP_REFILL_SECONDS = int(os.getenv("OTP_IP_REFILL_SECONDS", 30))
+
+    # Shared cache (e.g. redis://localhost:6379/0). Leave unset to use in-process caches.
+    CACHE_URL = os.getenv("CACHE_URL")
+    # Seconds a computed branch/aesthetician day occupancy stays cached
+    AVAILABILITY_CACHE_TTL = int(os.getenv("AVAILABILITY_CACHE_TTL", 30))
+    # "facts" reads analytics from appointment_daily_fact (falling back to raw appointments until it is built), "raw" always scans appointments
+    ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE", "facts")
+    # Seconds a cached forecast may live even if no completed appointment changes
+    FORECAST_CACHE_TTL = int(os.getenv("FORECAST_CACHE_TTL", 3600))
+
+    # Image uploads run in a background pool; "cloudinary" or "local" (files under UPLOAD_LOCAL_DIR)
+    UPLOAD_BACKEND = os.getenv("UPLOAD_BACKEND", "cloudinary")
+    UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+    UPLOAD_LOCAL_DIR = os.getenv("UPLOAD_LOCAL_DIR", "uploads")
+    UPLOAD_LOCAL_URL = os.getenv("UPLOAD_LOCAL_URL", "/uploads")
+    # image stored on new records until their upload finishes
+    UPLOAD_PLACEHOLDER_IMAGE = os.getenv("UPLOAD_PLACEHOLDER_IMAGE")
\ No newline at end of file
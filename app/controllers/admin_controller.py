@@ -2,7 +2,7 @@ from .base_crud_controller import BaseCRUDController
 from ..models.admin_model import Admin
 from ..models.branch_model import Branch
 from ..models.auth_model import Auth
-from flask_jwt_extended import get_jwt_identity
+from ..helper.principal import current_principal
 from flask import jsonify, request
 from ..extension import db
 
@@ -15,16 +15,16 @@ class AdminController(BaseCRUDController):
             updatable_fields=["admin_name", "branch_id", "image", "first_name", "last_name", "middle_initial"],
             searchable_fields=["first_name", "last_name"],
             filterable_fields={"branch": (Branch, "branch_id")},
-            joins=[(Branch, Branch.branch_id==Admin.branch_id), (Auth, Auth.account_id==Admin.account_id)]
+            joins=[(Branch, Branch.branch_id==Admin.branch_id), (Auth, Auth.account_id==Admin.account_id)],
+            eager_loads=[Admin.auth, Admin.branch]
         )
     
     def get_by_id(self):
-        identity = get_jwt_identity()
-        admin = Admin.query.filter_by(account_id=identity).first()
+        principal = current_principal()
         
-        if not admin:
+        if not principal or not principal.admin_id:
             return jsonify({"status": False, "message": "admin not found"}), 404
-        return super().get_by_id(admin.admin_id)
+        return super().get_by_id(principal.admin_id)
     
     # update the information of admin by the owner
     def owner_update_admin(self):
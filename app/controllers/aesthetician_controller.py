@@ -14,7 +14,8 @@ class AestheticianController(BaseCRUDController):
             searchable_fields=["first_name", "last_name"],
             filterable_fields={"sex": "sex", "experience": "experience", "availability": "availability", "branch": (Branch, "branch_id")},
             sortable_fields={"rate": Aesthetician.average_rate, "name":Aesthetician.first_name},
-            joins=[(Branch, Branch.branch_id==Aesthetician.branch_id)]
+            joins=[(Branch, Branch.branch_id==Aesthetician.branch_id)],
+            eager_loads=[Aesthetician.branch]
         )
     
     
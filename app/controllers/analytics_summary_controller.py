@@ -1,53 +1,95 @@
 from ..controllers.filter_analytics_controller import FilterAnalyticsController
 from ..extension import db
-from sqlalchemy import func, cast, Date
-from ..models.appointment_model import Appointment
+from sqlalchemy import func, case
 from ..models.service_model import Service
 from ..models.aesthetician_model import Aesthetician
 from ..models.branch_model import Branch
 from ..models.voucher_model import Voucher
+from ..helper.analytics_facts import analytics_source
 from datetime import date
+from dataclasses import dataclass
 import statistics
 
 
+@dataclass
+class SummaryMetrics:
+    """Appointment and sales summary for one filter set, computed by AnalyticsSummaryController.summary"""
+    appointments: int = 0
+    completed_appointments: int = 0
+    cancelled_appointments: int = 0
+    total_revenue: float = 0.0
+    total_discount_given: float = 0.0
+    cancellation_loss: float = 0.0
+
+    @property
+    def average_transaction_value(self):
+        if self.completed_appointments == 0:
+            return 0
+        return round(self.total_revenue / self.completed_appointments, 2)
+
+    @property
+    def completion_rate(self):
+        if self.appointments == 0:
+            return 0
+        return round((self.completed_appointments / self.appointments) * 100, 2)
+
+    @property
+    def cancellation_rate(self):
+        if self.appointments == 0:
+            return 0
+        return round((self.cancelled_appointments / self.appointments) * 100, 2)
+
+
 class AnalyticsSummaryController:
     def __init__(self):
         pass
+    
+    def summary(self):
+        """
+        Every appointment/sales summary metric in a single scan, using aggregate
+        FILTER (WHERE ...) clauses under the same branch/month/year/date range filters
+        """
+        params = FilterAnalyticsController.get_filter_params()
+        source = analytics_source()
+        completed = source.status == "completed"
+        cancelled = source.status == "cancelled"
+
+        query = db.session.query(
+            source.count().label("appointments"),
+            source.count_where(completed).label("completed_appointments"),
+            source.count_where(cancelled).label("cancelled_appointments"),
+            source.revenue().filter(completed).label("total_revenue"),
+            source.discount().filter(completed).label("total_discount_given"),
+            source.revenue().filter(cancelled).label("cancellation_loss"),
+        ).select_from(source.model)
+        query = FilterAnalyticsController.apply_not_deleted(query, source.model)
+        query = FilterAnalyticsController.apply_filter_branch(query, params["branch_id"], source)
+        query = FilterAnalyticsController.apply_filter_date(query, params["month"], params["year"], params["date_from"], params["date_to"], source)
+
+        row = query.one()
+        return SummaryMetrics(
+            appointments=int(row.appointments or 0),
+            completed_appointments=int(row.completed_appointments or 0),
+            cancelled_appointments=int(row.cancelled_appointments or 0),
+            total_revenue=float(row.total_revenue or 0),
+            total_discount_given=round(float(row.total_discount_given or 0), 2),
+            cancellation_loss=round(float(row.cancellation_loss or 0), 2),
+        )
         
     def total_appointments(self):
-        query = db.session.query(func.count(Appointment.appointment_id)).filter(Appointment.status=="completed")
-        query = FilterAnalyticsController.apply_is_completed(query)
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        return query.scalar() or 0
+        return self.summary().completed_appointments
     
     def total_revenue(self):
-        query = db.session.query(func.sum(Appointment.to_pay)).filter(Appointment.status=="completed")
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        return query.scalar() or 0
+        return self.summary().total_revenue
     
     def average_transaction_value(self):
-        total_revenue = self.total_revenue()
-        total_appointments = self.total_appointments()
-        if total_appointments == 0:
-            return 0
-        return round(total_revenue / total_appointments, 2)
+        return self.summary().average_transaction_value
     
     def total_discount_given(self):
-        query = db.session.query(func.sum(Appointment.discount_snapshot)).filter(
-            Appointment.status=="completed",
-            Appointment.discount_snapshot.isnot(None)
-        )
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        result = query.scalar() or 0
-        return round(result, 2)
+        return self.summary().total_discount_given
     
     def cancellation_loss(self):
-        query = db.session.query(func.sum(Appointment.to_pay)).filter(
-            Appointment.status=="cancelled"
-        )
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        result = query.scalar() or 0
-        return round(result, 2)
+        return self.summary().cancellation_loss
     
     def avarage_service_rating(self):
         query = db.session.query(func.avg(Service.average_rate))
@@ -70,11 +112,14 @@ class AnalyticsSummaryController:
     
 
     def avarage_overall_rating(self):
-        branch = self.avarage_branch_rating()
-        service = self.avarage_service_rating()
-        aesthetician = self.avarage_aesthetician_rating()
-
-        values = [branch, service, aesthetician]
+        # the three entity averages as scalar subqueries of one statement
+        averages = [
+            FilterAnalyticsController.apply_not_deleted(db.session.query(func.avg(model.average_rate)), model).scalar_subquery()
+            for model in (Branch, Service, Aesthetician)
+        ]
+        row = db.session.query(*averages).one()
+
+        values = [round(value, 2) if value is not None else 0 for value in row]
         valid_values = [v for v in values if v is not None]
 
         if not valid_values:
@@ -123,84 +168,32 @@ class AnalyticsSummaryController:
     
     
     def completion_rate(self):
-        params = FilterAnalyticsController.get_filter_params()
-
-        base_query = db.session.query(Appointment.appointment_id).filter(Appointment.isDeleted == False)
-        
-        base_query = FilterAnalyticsController.apply_filter_branch(base_query, params['branch_id'])
-        base_query = FilterAnalyticsController.apply_filter_date(base_query, params['year'], params['month'])
-        base_query = FilterAnalyticsController.apply_not_deleted(base_query, Appointment)
-
-        total_appointments = base_query.count()
-        
-        completed_query = base_query.filter(Appointment.status == "completed")
-        completed_appointments = completed_query.count()
-
-        if total_appointments == 0:
-            return 0
-        
-        return round((completed_appointments / total_appointments) * 100, 2)
+        return self.summary().completion_rate
 
 
     def cancellation_rate(self):
-        params = FilterAnalyticsController.get_filter_params()
-
-        base_query = db.session.query(Appointment.appointment_id).filter(Appointment.isDeleted == False)
-        base_query = FilterAnalyticsController.apply_filter_branch(base_query, params['branch_id'])
-        base_query = FilterAnalyticsController.apply_filter_date(base_query, params['year'], params['month'])
-        base_query = FilterAnalyticsController.apply_not_deleted(base_query, Appointment)
-
-        total_appointments = base_query.count()
-
-        cancelled_query = base_query.filter(Appointment.status == "cancelled")
-        cancelled_appointments = cancelled_query.count()
-
-        if total_appointments == 0:
-            return 0
-
-        return round((cancelled_appointments / total_appointments) * 100, 2)
+        return self.summary().cancellation_rate
 
 
     def branch_completion_rate(self):
-        # Total appointments per branch (excluding deleted)
-        total_query = (
-            db.session.query(
-                Appointment.branch_id,
-                func.count(Appointment.appointment_id).label("total")
-            )
-            .filter(Appointment.isDeleted == False)
-            .group_by(Appointment.branch_id)
-            .subquery()
-        )
+        source = analytics_source()
+        total = source.count()
+        completed = func.coalesce(func.sum(case((source.status == "completed", source.count_measure), else_=0)), 0)
 
-        # Completed appointments per branch (excluding deleted)
-        completed_query = (
-            db.session.query(
-                Appointment.branch_id,
-                func.count(Appointment.appointment_id).label("completed")
-            )
-            .filter(Appointment.status == "completed")
-            .filter(Appointment.isDeleted == False)
-            .group_by(Appointment.branch_id)
-            .subquery()
-        )
-
-        # Join both and calculate completion rate
-        result = (
+        # Completed / total appointments per branch (excluding deleted) in one grouped pass
+        query = (
             db.session.query(
                 Branch.branch_name.label("branch_name"),  # live branch name
-                (
-                    func.coalesce(completed_query.c.completed, 0) 
-                    / total_query.c.total * 100
-                ).label("completion_rate")
+                (completed * 100.0 / total).label("completion_rate")
             )
-            .join(total_query, Branch.branch_id == total_query.c.branch_id)   # inner join ensures only branches with appointments appear
-            .outerjoin(completed_query, completed_query.c.branch_id == total_query.c.branch_id)
-            .all()
+            .select_from(source.model)
+            .join(Branch, Branch.branch_id == source.branch_id)  # inner join ensures only branches with appointments appear
+            .group_by(Branch.branch_id, Branch.branch_name)
         )
+        query = FilterAnalyticsController.apply_not_deleted(query, source.model)
 
         # Format result into dictionary
-        return {row.branch_name: float(round(row.completion_rate, 2)) for row in result}
+        return {row.branch_name: float(round(row.completion_rate, 2)) for row in query.all()}
 
 
 
@@ -235,25 +228,28 @@ class AnalyticsSummaryController:
     
 
     def appointments_per_branch(self):
+        source = analytics_source()
         daily_counts = (
             db.session.query(
-                Appointment.branch_name_snapshot.label("branch"),
-                cast(Appointment.created_at, Date).label("day"),
-                func.count(Appointment.appointment_id).label("daily_count")
+                source.branch_id.label("branch_id"),
+                source.day.label("day"),
+                source.count().label("daily_count")
             )
-            .filter(Appointment.isDeleted.is_(False), Appointment.status=="completed")
-            .group_by(Appointment.branch_id, Appointment.branch_name_snapshot, cast(Appointment.created_at, Date))
-            .subquery()
+            .filter(source.status=="completed")
+            .group_by(source.branch_id, source.day)
         )
+        daily_counts = FilterAnalyticsController.apply_not_deleted(daily_counts, source.model).subquery()
 
         query = (
             db.session.query(
-                daily_counts.c.branch,
+                Branch.branch_name.label("branch"),
                 func.round(func.avg(daily_counts.c.daily_count)).label("daily_average")
             )
-            .group_by(daily_counts.c.branch)
+            .select_from(daily_counts)
+            .join(Branch, Branch.branch_id == daily_counts.c.branch_id)
+            .group_by(Branch.branch_id, Branch.branch_name)
             .order_by(func.avg(daily_counts.c.daily_count).desc())
             .limit(4)
         )
 
-        return [dict(row._mapping) for row in query.all()]
\ No newline at end of file
+        return [dict(row._mapping) for row in query.all()]
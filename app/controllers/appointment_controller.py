@@ -3,16 +3,24 @@ from ..models.appointment_model import Appointment
 from ..models.walk_in_model import WalkIn
 from ..models.user_model import User
 from ..extension import db
-from flask_jwt_extended import get_jwt_identity
-from flask import jsonify, request
+from flask import jsonify, request, current_app
 from ..models.branch_model import Branch
 from ..models.aesthetician_model import Aesthetician
 from ..models.service_model import Service
 from ..models.voucher_model import Voucher
-from sqlalchemy import func, asc, and_
-from datetime import  datetime, timedelta
+from sqlalchemy import func, asc, and_, or_
+from datetime import  datetime, timedelta, timezone
 import pytz
 from ..socket_events import emit_new_appointment, emit_appointment_updated, emit_appointment_deleted
+from ..helper.date_range import on_day, parse_date
+from ..helper.cache import get_cache
+from ..helper.pagination import decode_cursor, encode_cursor, keyset_after, keyset_order
+from ..helper.principal import current_principal
+from ..helper.forecast_cache import invalidate_forecasts
+from ..helper.availability import ACTIVE_STATUSES, DayOccupancy, build_slots, load_occupancy, invalidate_availability, normalize_start
+
+# longest range served by the availability calendar in one request
+MAX_CALENDAR_DAYS = 62
 
 class AppointmentController(BaseCRUDController):
     def __init__(self):
@@ -23,35 +31,51 @@ class AppointmentController(BaseCRUDController):
             sortable_fields={"start-time":Appointment.start_time},
             filterable_fields={"status": "status", "branch": (Branch, "branch_id"), "aesthetician": (Aesthetician, "aesthetician_name"), "service": (Service, "service_name"), "date":"start_time"},
             updatable_fields=["status", "aesthetician_id", "aesthetician_name_snapshot", "aesthetician_rating", "service_rating", "branch_rating", "service_comment", "branch_comment", "aesthetician_comment", "payment_status"],
-            joins=[(User, User.user_id==Appointment.user_id, "left"), (WalkIn, WalkIn.walk_in_id==Appointment.walk_in_id, "left"), (Branch, Branch.branch_id==Appointment.branch_id), (Aesthetician, Aesthetician.aesthetician_id==Appointment.aesthetician_id, "left"), (Service, Service.service_id==Appointment.service_id)]
+            joins=[(User, User.user_id==Appointment.user_id, "left"), (WalkIn, WalkIn.walk_in_id==Appointment.walk_in_id, "left"), (Branch, Branch.branch_id==Appointment.branch_id), (Aesthetician, Aesthetician.aesthetician_id==Appointment.aesthetician_id, "left"), (Service, Service.service_id==Appointment.service_id)],
+            date_field="start_time"
         )
     
     def delete(self, id):
         """Override delete to emit WebSocket event"""
+        appointment = Appointment.query.get(id)
+        affected = self._availability_state(appointment) if appointment else None
+        was_completed = appointment is not None and appointment.status == "completed"
+        deleted_data = appointment.to_dict() if appointment else None
+
         response = super().delete(id)
         
         # If deletion was successful, emit WebSocket event
         if response[1] == 200:  # Check status code
-            emit_appointment_deleted(id)
+            if affected:
+                invalidate_availability(*affected)
+            if was_completed:
+                invalidate_forecasts()
+            if deleted_data:
+                self._invalidate_review_summary(deleted_data)
+                emit_appointment_deleted(deleted_data)
         
         return response
+
+    def _availability_state(self, appointment):
+        """(branch_id, aesthetician_id, start_time) used to invalidate cached day occupancy"""
+        return (appointment.branch_id, appointment.aesthetician_id, appointment.start_time)
     
     def get_appointment_history(self):
         """Get appointment history for the authenticated user with proper date filtering"""
         try:
             # Get the authenticated user
-            identity = get_jwt_identity()
-            user = User.query.filter_by(account_id=identity).first()
-            if not user:
+            user = current_principal()
+            if not user or not user.user_id:
                 return jsonify({"status": False, "message": "User not found"}), 404
             
             # Start with base query with joins
             query = self._apply_joins(db.session.query(self.model))
             
             # Apply date filtering if date parameter is present
-            date_value = request.args.get("date")
+            date_value = parse_date(request.args.get("date"))
             if date_value:
-                query = query.filter(func.date(Appointment.start_time) == date_value)
+                query = query.filter(on_day(Appointment.start_time, date_value))
+            query = self._apply_date_range(query)
             
             # Apply other filters (excluding date since we handled it)
             for param, model_field in self.filterable_fields.items():
@@ -82,6 +106,11 @@ class AppointmentController(BaseCRUDController):
                 "appointment": [appointment.to_dict() for appointment in appointments],
                 "total": len(appointments)
             }), 200
+        except ValueError as e:
+            return jsonify({
+                "status": False,
+                "message": str(e)
+            }), 400
         except Exception as e:
             print(f"Error in get_appointment_history: {str(e)}")
             import traceback
@@ -97,6 +126,10 @@ class AppointmentController(BaseCRUDController):
     def _apply_sorting(self, query):
         return query.order_by(asc(Appointment.start_time))
     
+    def _cursor_order(self):
+        # keep cursor pages in the same order as _apply_sorting
+        return Appointment.start_time, "asc"
+    
     def _apply_filters(self, query):
         """Override to handle date filtering on start_time datetime field"""
         # Check if there's a search query - if so, skip date filtering to search across all dates
@@ -110,8 +143,8 @@ class AppointmentController(BaseCRUDController):
                     continue
                 # Special handling for date filtering on start_time
                 elif param == "date" and model_field == "start_time":
-                    # Extract date from start_time datetime and compare
-                    query = query.filter(func.date(Appointment.start_time) == value)
+                    # Range on start_time so the index can be used
+                    query = query.filter(on_day(Appointment.start_time, parse_date(value)))
                 elif isinstance(model_field, tuple):
                     model, field = model_field
                     query = query.filter(getattr(model, field) == value)
@@ -122,58 +155,23 @@ class AppointmentController(BaseCRUDController):
     
     def update_reviews(self):
         data = request.get_json()
-        identity = get_jwt_identity()
-        
-        user = User.query.filter_by(account_id=identity).first()
-        if not user:
+        user = current_principal()
+        if not user or not user.user_id:
             return jsonify({"status": False, "message": "user not found"}), 404
         
         appointment = Appointment.query.filter_by(appointment_id=data.get("appointment_id")).first()
         if not appointment:
             return jsonify({"status": False, "message": "appointment not found"}), 404
 
-        if "branch_rating" in data:
-            appointment.branch_rating = data["branch_rating"]
-
-        if "service_rating" in data:
-            appointment.service_rating = data["service_rating"]
-
-        if "aesthetician_rating" in data:
-            appointment.aesthetician_rating = data["aesthetician_rating"]
-
-        comment_fields = ["aesthetician_comment", "branch_comment", "service_comment"]
-        for field in comment_fields:
+        # the running rating totals follow in the flush, see helper/ratings.py
+        review_fields = ["branch_rating", "service_rating", "aesthetician_rating", "aesthetician_comment", "branch_comment", "service_comment"]
+        for field in review_fields:
             if field in data:
                 setattr(appointment, field, data[field])
 
         db.session.commit()
 
-        if "branch_rating" in data:
-            self._update_average_rating(
-                Appointment.branch_rating,
-                Appointment.branch_id,
-                appointment.branch_id,
-                Branch,
-                Branch.branch_id
-            )
-
-        if "service_rating" in data:
-            self._update_average_rating(
-                Appointment.service_rating,
-                Appointment.service_id,
-                appointment.service_id,
-                Service,
-                Service.service_id
-            )
-
-        if "aesthetician_rating" in data:
-            self._update_average_rating(
-                Appointment.aesthetician_rating,
-                Appointment.aesthetician_id,
-                appointment.aesthetician_id,
-                Aesthetician,
-                Aesthetician.aesthetician_id
-            )
+        self._invalidate_review_summary(appointment.to_dict())
 
         return jsonify({"status": True, "message": "appointment updated successfully"}), 200
 
@@ -184,8 +182,10 @@ class AppointmentController(BaseCRUDController):
             return jsonify({"status": False, "message": "appointment not found"}), 404
 
         # Save old values to know which branches need recalculation
+        before = appointment.to_dict()
         old_branch_id = appointment.branch_id
         old_status = appointment.status
+        old_state = self._availability_state(appointment)
 
         # Apply provided updates to the appointment object (only status handled here explicitly)
         new_status = data.get("status")
@@ -208,11 +208,22 @@ class AppointmentController(BaseCRUDController):
             branch_ids_to_recalc.add(data["branch_id"])
             appointment.branch_id = data["branch_id"]
 
+        # Apply the remaining fields here so the commit, cache invalidation and
+        # WebSocket event below all see the final state of the appointment
+        self._apply_updatable_fields(appointment, data)
+
         db.session.commit()
         db.session.refresh(appointment)
+
+        invalidate_availability(*old_state)
+        invalidate_availability(*self._availability_state(appointment))
+        if "completed" in (old_status, appointment.status):
+            invalidate_forecasts()
+        # ratings or the rated aesthetician/branch may have changed
+        self._invalidate_review_summary(before, appointment.to_dict())
         
-        # Emit WebSocket event for appointment update
-        emit_appointment_updated(appointment.to_dict())
+        # Emit WebSocket event with the fields that changed
+        emit_appointment_updated(appointment, before)
         
         return appointment
 
@@ -234,10 +245,9 @@ class AppointmentController(BaseCRUDController):
 
             # Authenticated user logic
             else:
-                identity = get_jwt_identity()
-                user = User.query.filter_by(account_id=identity).first()
+                user = current_principal()
                 # check if user exists
-                if not user:
+                if not user or not user.user_id:
                     return jsonify({"status": False, "message": "user not found"}), 404
                 # check if appointment for the same service already exists
                 service_id = data.get("service_id")
@@ -294,7 +304,7 @@ class AppointmentController(BaseCRUDController):
                     Appointment.user_id==user.user_id,
                     Appointment.isDeleted==False,
                     Appointment.status.in_(["waiting", "on-process", "pending"]),
-                    func.date(Appointment.start_time) == new_date
+                    on_day(Appointment.start_time, new_date)
                 ).all()
 
                 for apt in user_appointments:
@@ -401,7 +411,7 @@ class AppointmentController(BaseCRUDController):
             Appointment.branch_id == appointment_data["branch_id"],
             Appointment.status.in_(["waiting", "on-process", "pending"]),
             Appointment.isDeleted == False,
-            func.date(Appointment.start_time) == appointment_datetime.date()
+            on_day(Appointment.start_time, appointment_datetime.date())
         ).all()
         
         # Count how many appointments overlap with the new time slot
@@ -585,8 +595,12 @@ class AppointmentController(BaseCRUDController):
         db.session.commit()
         db.session.refresh(new_appointment)
 
+        invalidate_availability(*self._availability_state(new_appointment))
+        if new_appointment.status == "completed":
+            invalidate_forecasts()
+
         # Emit WebSocket event for new appointment
-        emit_new_appointment(new_appointment.to_dict())
+        emit_new_appointment(new_appointment)
 
         return jsonify({
             "status": True,
@@ -595,80 +609,153 @@ class AppointmentController(BaseCRUDController):
         }), 201
 
     def get_reviews(self, service_id=None, aesthetician_id=None, branch_id=None):
-        query = Appointment.query.with_entities(
-            Appointment.service_rating,
-            Appointment.branch_rating,
-            Appointment.aesthetician_rating,
-            Appointment.service_comment,
-            Appointment.branch_comment,
-            Appointment.aesthetician_comment,
-            Appointment.customer_name_snapshot,
-            Appointment.user_id,
-        )
-
-        if service_id:
-            query = query.filter_by(service_id=service_id)
-        elif aesthetician_id:
-            query = query.filter_by(aesthetician_id=aesthetician_id)
-        elif branch_id:
-            query = query.filter_by(branch_id=branch_id)
+        """
+        Paginated reviews with the reviewer's image joined in, plus an optional
+        rating summary (?summary=true) for the selected service/aesthetician/branch.
+        """
+        page = max(request.args.get("page", 1, type=int), 1)
+        per_page = max(1, min(request.args.get("limit", 20, type=int), 100))
 
-        reviews = query.all()
+        query = (
+            db.session.query(
+                Appointment.service_rating,
+                Appointment.branch_rating,
+                Appointment.aesthetician_rating,
+                Appointment.service_comment,
+                Appointment.branch_comment,
+                Appointment.aesthetician_comment,
+                Appointment.customer_name_snapshot,
+                User.image.label("customer_image"),
+            )
+            .outerjoin(User, User.user_id == Appointment.user_id)
+        )
 
-        if not reviews:
+        target = self._review_target(service_id, aesthetician_id, branch_id)
+        if target:
+            _, fk_field, _, fk_value = target
+            query = query.filter(fk_field == fk_value)
+
+        # Skip appointments where all ratings and comments are None/empty
+        query = query.filter(or_(
+            Appointment.service_rating.isnot(None),
+            Appointment.branch_rating.isnot(None),
+            Appointment.aesthetician_rating.isnot(None),
+            and_(Appointment.service_comment.isnot(None), Appointment.service_comment != ""),
+            and_(Appointment.branch_comment.isnot(None), Appointment.branch_comment != ""),
+            and_(Appointment.aesthetician_comment.isnot(None), Appointment.aesthetician_comment != ""),
+        ))
+
+        rows = (
+            query.order_by(Appointment.start_time.desc(), Appointment.appointment_id.desc())
+            .limit(per_page + 1)
+            .offset((page - 1) * per_page)
+            .all()
+        )
+        has_next = len(rows) > per_page
+
+        data = [{
+            "service_rating": r.service_rating,
+            "branch_rating": r.branch_rating,
+            "aesthetician_rating": r.aesthetician_rating,
+            "service_comment": r.service_comment,
+            "branch_comment": r.branch_comment,
+            "aesthetician_comment": r.aesthetician_comment,
+            "customer_name": r.customer_name_snapshot,
+            "customer_image": r.customer_image
+        } for r in rows[:per_page]]
+
+        if not data and page == 1:
             return {"status": False, "message": "No reviews found"}, 404
 
-        data = []
-        for r in reviews:
-            # Skip appointments where all ratings and comments are None/empty
-            if (
-                r.service_rating is None and
-                r.branch_rating is None and
-                r.aesthetician_rating is None and
-                not r.service_comment and
-                not r.branch_comment and
-                not r.aesthetician_comment
-            ):
-                continue
+        response = {"status": True, "review": data, "page": page, "has_prev": page > 1, "has_next": has_next}
+        if target and request.args.get("summary", "").lower() == "true":
+            response["summary"] = self._review_summary(*target)
+        return response
 
-            customer_image = None
-            # Registered user
-            user = User.query.get(r.user_id)
-            if user and getattr(user, "image", None):
-                customer_image = user.image
-
-
-            data.append({
-                "service_rating": r.service_rating,
-                "branch_rating": r.branch_rating,
-                "aesthetician_rating": r.aesthetician_rating,
-                "service_comment": r.service_comment,
-                "branch_comment": r.branch_comment,
-                "aesthetician_comment": r.aesthetician_comment,
-                "customer_name": r.customer_name_snapshot,
-                "customer_image": customer_image
-            })
-
-        if not data:
-            return {"status": False, "message": "No reviews found"}, 404
+    def _review_target(self, service_id=None, aesthetician_id=None, branch_id=None):
+        """(kind, appointment fk column, rating column, id) for the reviewed entity, or None"""
+        if service_id:
+            return "service", Appointment.service_id, Appointment.service_rating, service_id
+        if aesthetician_id:
+            return "aesthetician", Appointment.aesthetician_id, Appointment.aesthetician_rating, aesthetician_id
+        if branch_id:
+            return "branch", Appointment.branch_id, Appointment.branch_rating, branch_id
+        return None
+
+    def _review_summary(self, kind, fk_field, rating_field, fk_value):
+        """Rating histogram (rounded to whole stars), count and mean, cached until a new review"""
+        cache = get_cache("review_summary", max_entries=1024, ttl=300)
+        key = f"{kind}:{fk_value}"
+        summary = cache.get(key)
+        if summary is not None:
+            return summary
+
+        star = func.round(rating_field)
+        rows = (
+            db.session.query(star, func.count(rating_field), func.sum(rating_field))
+            .filter(fk_field == fk_value, rating_field.isnot(None))
+            .group_by(star)
+            .all()
+        )
 
-        return {"status": True, "review": data}
+        histogram = {str(stars): 0 for stars in range(1, 6)}
+        count = 0
+        total = 0.0
+        for stars, stars_count, stars_sum in rows:
+            histogram[str(int(stars))] = histogram.get(str(int(stars)), 0) + stars_count
+            count += stars_count
+            total += float(stars_sum or 0)
+
+        summary = {
+            "count": count,
+            "mean": round(total / count, 2) if count else 0,
+            "histogram": histogram
+        }
+        cache.set(key, summary)
+        return summary
+
+    def _invalidate_review_summary(self, *appointments_data):
+        """Drop the cached summaries of the service/aesthetician/branch of each Appointment.to_dict()"""
+        keys = []
+        for appointment_data in appointments_data:
+            keys += [
+                f"service:{appointment_data['service_id']}",
+                f"aesthetician:{appointment_data['aesthetician_id']}",
+                f"branch:{appointment_data['branch_id']}"
+            ]
+        get_cache("review_summary", max_entries=1024, ttl=300).delete(*keys)
+
+    def _slot_settings(self, branch_id, service_id, aesthetician_id=None):
+        """Validate branch/service/aesthetician for slot generation, returns (settings, error message)"""
+        # Fetch branch
+        branch = Branch.query.get(branch_id)
+        if not branch:
+            return None, "Branch not found"
 
+        slot_capacity = branch.slot_capacity
+        if not slot_capacity or slot_capacity <= 0:
+            return None, "Invalid branch slot capacity"
 
+        # Fetch service duration
+        service = Service.query.get(service_id)
+        if not service:
+            return None, "Service not found"
 
-    def _update_average_rating(self, appointment_model_field, appointment_fk_field, fk_value, target_model, target_id_field):
-        # Compute the average rating for the given foreign key (only non-null ratings)
-        avg_rating = db.session.query(func.avg(appointment_model_field)).filter(
-            appointment_fk_field == fk_value,
-            appointment_model_field.isnot(None)
-        ).scalar()
+        duration = service.duration  # minutes
+        if not duration or duration <= 0:
+            return None, "Invalid service duration"
 
-        # Update the corresponding model's average_rate
-        db.session.query(target_model).filter(target_id_field == fk_value).update(
-            {"average_rate": round(avg_rating, 2) if avg_rating else 0}
-        )
+        # If aesthetician_id is provided, validate it
+        if aesthetician_id and not Aesthetician.query.get(aesthetician_id):
+            return None, "Aesthetician not found"
 
-        db.session.commit()
+        return {
+            "slot_capacity": slot_capacity,
+            # Fetch opening and closing times from branch
+            "opening_time": branch.opening_time if branch.opening_time else datetime.strptime("10:00", "%H:%M").time(),
+            "closing_time": branch.closing_time if branch.closing_time else datetime.strptime("17:00", "%H:%M").time(),
+            "duration": duration,
+        }, None
 
     def get_available_slots(self):
         """
@@ -689,10 +776,8 @@ class AppointmentController(BaseCRUDController):
             date_str = request.args.get("date")
 
             # Get the authenticated user (if any)
-            identity = get_jwt_identity()
-            user = None
-            if identity:
-                user = User.query.filter_by(account_id=identity).first()
+            principal = current_principal()
+            user = principal if principal and principal.user_id else None
 
             # Validate required parameters
             if not all([branch_id, service_id, date_str]):
@@ -704,180 +789,66 @@ class AppointmentController(BaseCRUDController):
             except ValueError:
                 return jsonify({"status": False, "message": "Invalid date format. Use YYYY-MM-DD"})
 
-            # Fetch branch
-            branch = Branch.query.get(branch_id)
-            if not branch:
-                return jsonify({"status": False, "message": "Branch not found"})
+            settings, error = self._slot_settings(branch_id, service_id, aesthetician_id)
+            if error:
+                return jsonify({"status": False, "message": error})
 
-            slot_capacity = branch.slot_capacity
-            if not slot_capacity or slot_capacity <= 0:
-                return jsonify({"status": False, "message": "Invalid branch slot capacity"})
+            slot_capacity = settings["slot_capacity"]
+            opening_time = settings["opening_time"]
+            closing_time = settings["closing_time"]
+            duration = settings["duration"]
 
-            # Fetch opening and closing times from branch
-            opening_time = branch.opening_time if branch.opening_time else datetime.strptime("10:00", "%H:%M").time()
-            closing_time = branch.closing_time if branch.closing_time else datetime.strptime("17:00", "%H:%M").time()
-
-            # Fetch service duration
-            service = Service.query.get(service_id)
-            if not service:
-                return jsonify({"status": False, "message": "Service not found"})
-
-            duration = service.duration  # minutes
-            if not duration or duration <= 0:
-                return jsonify({"status": False, "message": "Invalid service duration"})
-
-            # If aesthetician_id is provided, validate it
-            aesthetician = None
-            if aesthetician_id:
-                aesthetician = Aesthetician.query.get(aesthetician_id)
-                if not aesthetician:
-                    return jsonify({"status": False, "message": "Aesthetician not found"})
-
-            # Define working hours based on branch times
-            shift_start = datetime.combine(date, opening_time)
-            shift_end = datetime.combine(date, closing_time)
-            
-            # If closing time is midnight (00:00:00), it means end of day, so add 1 day
-            if closing_time.hour == 0 and closing_time.minute == 0 and closing_time.second == 0:
-                shift_end = shift_end + timedelta(days=1)
-
-            # Fetch all active appointments for the branch on the given date
-            branch_appointments = Appointment.query.filter(
-                Appointment.branch_id == branch_id,
-                Appointment.isDeleted == False,
-                Appointment.status.in_(["waiting", "on-process", "pending"]),
-                func.date(Appointment.start_time) == date
-            ).all()
+            # Active appointments for the branch on the given date (cached per branch/day)
+            branch_occupancy = load_occupancy(
+                "branch", branch_id, date,
+                lambda: Appointment.query.filter(
+                    Appointment.branch_id == branch_id,
+                    Appointment.isDeleted == False,
+                    Appointment.status.in_(ACTIVE_STATUSES),
+                    on_day(Appointment.start_time, date)
+                ).all()
+            )
 
             # Fetch all active appointments for the user on the given date (for self-conflict)
-            user_appointments = []
+            user_occupancy = None
             if user:
                 user_appointments = Appointment.query.filter(
                     Appointment.user_id == user.user_id,
                     Appointment.isDeleted == False,
-                    Appointment.status.in_(["waiting", "on-process", "pending"]),
-                    func.date(Appointment.start_time) == date
+                    Appointment.status.in_(ACTIVE_STATUSES),
+                    on_day(Appointment.start_time, date)
                 ).all()
-            # If aesthetician is specified, fetch their appointments
-            aesthetician_appointments = []
+                user_occupancy = DayOccupancy.from_appointments(user_appointments, default_duration=60)
+
+            # If aesthetician is specified, fetch their appointments (cached per aesthetician/day)
+            aesthetician_occupancy = None
             if aesthetician_id:
-                aesthetician_appointments = Appointment.query.filter(
-                    Appointment.aesthetician_id == aesthetician_id,
-                    Appointment.isDeleted == False,
-                    Appointment.status.in_(["waiting", "on-process", "pending"]),
-                    func.date(Appointment.start_time) == date
-                ).all()
+                aesthetician_occupancy = load_occupancy(
+                    "aesthetician", aesthetician_id, date,
+                    lambda: Appointment.query.filter(
+                        Appointment.aesthetician_id == aesthetician_id,
+                        Appointment.isDeleted == False,
+                        Appointment.status.in_(ACTIVE_STATUSES),
+                        on_day(Appointment.start_time, date)
+                    ).all()
+                )
 
-            # Generate slots
-            slots = []
-            current = shift_start
-            
             # Get current time in Philippines timezone
             philippines_tz = pytz.timezone('Asia/Manila')
             now = datetime.now(philippines_tz).replace(tzinfo=None)  # Get PH time as naive datetime
 
-            while current + timedelta(minutes=duration) <= shift_end:
-                slot_end = current + timedelta(minutes=duration)
-                
-                # Default status
-                status = "available"
-                
-                # Check if slot is in the past by comparing the actual datetime
-                # This works correctly even when closing time is midnight (next day)
-                if current < now:
-                    status = "past"
-                else:
-                    # Check for self-conflict (user has overlapping appointment at this time)
-                    self_conflict = False
-                    if user and user_appointments:
-                        for apt in user_appointments:
-                            apt_start = apt.start_time
-                            if isinstance(apt_start, str):
-                                try:
-                                    apt_start = datetime.strptime(apt_start, "%Y-%m-%d %H:%M:%S")
-                                except Exception:
-                                    continue
-                            if not isinstance(apt_start, datetime):
-                                continue
-                            if apt_start.tzinfo is not None:
-                                apt_start = apt_start.replace(tzinfo=None)
-                            apt_duration = getattr(apt, "duration", 60) or 60
-                            try:
-                                apt_duration = int(apt_duration)
-                            except Exception:
-                                apt_duration = 60
-                            apt_end = apt_start + timedelta(minutes=apt_duration)
-                            # Check for overlap
-                            if current < apt_end and slot_end > apt_start:
-                                self_conflict = True
-                                break
-                    if self_conflict:
-                        status = "conflict"
-                    else:
-                        # Check if aesthetician is busy at this time (if aesthetician_id provided)
-                        aesthetician_busy = False
-                        if aesthetician_id and aesthetician_appointments:
-                            for appointment in aesthetician_appointments:
-                                if not appointment.duration or appointment.duration <= 0:
-                                    continue
-                                existing_start = appointment.start_time
-                                # Handle string conversion
-                                if isinstance(existing_start, str):
-                                    try:
-                                        existing_start = datetime.strptime(existing_start, "%Y-%m-%d %H:%M:%S")
-                                    except ValueError:
-                                        continue
-                                if not isinstance(existing_start, datetime):
-                                    continue
-                                if existing_start.tzinfo is not None:
-                                    existing_start = existing_start.replace(tzinfo=None)
-                                if existing_start.date() != date:
-                                    existing_start = datetime.combine(date, existing_start.time())
-                                existing_end = existing_start + timedelta(minutes=appointment.duration)
-                                # Check for overlap
-                                if current < existing_end and slot_end > existing_start:
-                                    aesthetician_busy = True
-                                    break
-                        if aesthetician_busy:
-                            status = "booked"
-                        else:
-                            # Check branch capacity
-                            concurrent_count = 0
-                            for appointment in branch_appointments:
-                                if not appointment.duration or appointment.duration <= 0:
-                                    continue
-                                existing_start = appointment.start_time
-                                if isinstance(existing_start, str):
-                                    try:
-                                        existing_start = datetime.strptime(existing_start, "%Y-%m-%d %H:%M:%S")
-                                    except ValueError:
-                                        continue
-                                if not isinstance(existing_start, datetime):
-                                    continue
-                                if existing_start.tzinfo is not None:
-                                    existing_start = existing_start.replace(tzinfo=None)
-                                if existing_start.date() != date:
-                                    existing_start = datetime.combine(date, existing_start.time())
-                                existing_end = existing_start + timedelta(minutes=appointment.duration)
-                                # Check for overlap
-                                if current < existing_end and slot_end > existing_start:
-                                    concurrent_count += 1
-                            # If concurrent appointments >= slot_capacity, mark as booked
-                            if concurrent_count >= slot_capacity:
-                                status = "booked"
-
-                # Add slot with status
-                slot_range = {
-                    "start_time": current.strftime("%I:%M %p"),
-                    "end_time": slot_end.strftime("%I:%M %p"),
-                    "start_time_24": current.strftime("%H:%M"),
-                    "end_time_24": slot_end.strftime("%H:%M"),
-                    "status": status
-                }
-                slots.append(slot_range)
-
-                # Move to next slot
-                current += timedelta(minutes=duration)
+            # Build the occupancy index once and classify every slot in a single pass
+            slots = build_slots(
+                day=date,
+                opening_time=opening_time,
+                closing_time=closing_time,
+                duration=duration,
+                slot_capacity=slot_capacity,
+                now=now,
+                branch_occupancy=branch_occupancy,
+                aesthetician_occupancy=aesthetician_occupancy,
+                user_occupancy=user_occupancy
+            )
 
             response = {
                 "status": True,
@@ -901,4 +872,225 @@ class AppointmentController(BaseCRUDController):
         except Exception as e:
             return jsonify({"status": False, "message": "Internal error", "error": str(e)})
 
+    def get_available_calendar(self):
+        """
+        Slot availability for a range of days, loaded with a single appointment query.
+
+        Query params:
+        - branch_id: Required - The branch ID
+        - aesthetician_id: Optional - The aesthetician ID
+        - service_id: Required - The service ID (to get duration)
+        - date_from, date_to: Required - Inclusive range in YYYY-MM-DD format (max 62 days)
+
+        Each day carries a slot bitmap ("1" = available) aligned with slot_times,
+        plus a summary of fully booked / partially available days.
+        """
+        try:
+            branch_id = request.args.get("branch_id")
+            aesthetician_id = request.args.get("aesthetician_id")
+            service_id = request.args.get("service_id")
+            date_from_str = request.args.get("date_from")
+            date_to_str = request.args.get("date_to")
+
+            if not all([branch_id, service_id, date_from_str, date_to_str]):
+                return jsonify({"status": False, "message": "Missing required parameters: branch_id, service_id, date_from, date_to"}), 400
+
+            try:
+                date_from = datetime.strptime(date_from_str, "%Y-%m-%d").date()
+                date_to = datetime.strptime(date_to_str, "%Y-%m-%d").date()
+            except ValueError:
+                return jsonify({"status": False, "message": "Invalid date format. Use YYYY-MM-DD"}), 400
+
+            if date_to < date_from:
+                return jsonify({"status": False, "message": "date_to must not be before date_from"}), 400
+            if (date_to - date_from).days >= MAX_CALENDAR_DAYS:
+                return jsonify({"status": False, "message": f"Date range cannot exceed {MAX_CALENDAR_DAYS} days"}), 400
+
+            settings, error = self._slot_settings(branch_id, service_id, aesthetician_id)
+            if error:
+                return jsonify({"status": False, "message": error}), 404
 
+            principal = current_principal()
+            user = principal if principal and principal.user_id else None
+
+            # One query for every appointment that can affect the range: the branch's,
+            # the aesthetician's and the user's own (for self-conflict)
+            owners = [Appointment.branch_id == branch_id]
+            if aesthetician_id:
+                owners.append(Appointment.aesthetician_id == aesthetician_id)
+            if user:
+                owners.append(Appointment.user_id == user.user_id)
+
+            appointments = Appointment.query.filter(
+                Appointment.isDeleted == False,
+                Appointment.status.in_(ACTIVE_STATUSES),
+                Appointment.start_time >= datetime.combine(date_from, datetime.min.time()),
+                Appointment.start_time < datetime.combine(date_to + timedelta(days=1), datetime.min.time()),
+                or_(*owners)
+            ).all()
+
+            by_day = {}
+            for appointment in appointments:
+                start = normalize_start(appointment.start_time)
+                if start is not None:
+                    by_day.setdefault(start.date(), []).append(appointment)
+
+            philippines_tz = pytz.timezone('Asia/Manila')
+            now = datetime.now(philippines_tz).replace(tzinfo=None)
+
+            days = []
+            summary = {"available": [], "partially_available": [], "fully_booked": [], "unavailable": []}
+            slot_times = []
+            day = date_from
+            while day <= date_to:
+                day_appointments = by_day.get(day, [])
+                slots = build_slots(
+                    day=day,
+                    opening_time=settings["opening_time"],
+                    closing_time=settings["closing_time"],
+                    duration=settings["duration"],
+                    slot_capacity=settings["slot_capacity"],
+                    now=now,
+                    branch_occupancy=DayOccupancy.from_appointments(
+                        [a for a in day_appointments if a.branch_id == branch_id]
+                    ),
+                    aesthetician_occupancy=DayOccupancy.from_appointments(
+                        [a for a in day_appointments if a.aesthetician_id == aesthetician_id]
+                    ) if aesthetician_id else None,
+                    user_occupancy=DayOccupancy.from_appointments(
+                        [a for a in day_appointments if a.user_id == user.user_id], default_duration=60
+                    ) if user else None
+                )
+                if not slot_times:
+                    slot_times = [slot["start_time_24"] for slot in slots]
+
+                bitmap = "".join("1" if slot["status"] == "available" else "0" for slot in slots)
+                available = bitmap.count("1")
+                upcoming = sum(1 for slot in slots if slot["status"] != "past")
+
+                if upcoming == 0:
+                    day_status = "unavailable"
+                elif available == 0:
+                    day_status = "fully_booked"
+                elif available == upcoming:
+                    day_status = "available"
+                else:
+                    day_status = "partially_available"
+
+                summary[day_status].append(day.isoformat())
+                days.append({
+                    "date": day.isoformat(),
+                    "bitmap": bitmap,
+                    "available_count": available,
+                    "status": day_status
+                })
+                day += timedelta(days=1)
+
+            response = {
+                "status": True,
+                "branch_id": branch_id,
+                "service_id": service_id,
+                "date_from": date_from_str,
+                "date_to": date_to_str,
+                "slot_times": slot_times,
+                "days": days,
+                "summary": summary,
+                "service_duration": settings["duration"],
+                "slot_capacity": settings["slot_capacity"],
+                "working_hours": {
+                    "opening_time": settings["opening_time"].strftime("%H:%M"),
+                    "closing_time": settings["closing_time"].strftime("%H:%M")
+                }
+            }
+
+            if aesthetician_id:
+                response["aesthetician_id"] = aesthetician_id
+
+            return jsonify(response)
+
+        except Exception as e:
+            return jsonify({"status": False, "message": "Internal error", "error": str(e)}), 500
+
+    def get_changes(self):
+        """
+        Appointments written since a client watermark, for incremental sync.
+
+        Query params:
+        - since: ISO timestamp for the first sync (omit to start from the beginning)
+        - cursor: The cursor returned by the previous call, takes precedence over since
+        - branch_id: Optional for owners; admins always get their own branch
+        - limit: Page size (default 500, max 1000)
+
+        Returns upserts (full records) and tombstones (soft-deleted appointments) in
+        (updated_at, appointment_id) order, and the cursor to send next time. Writes
+        from the last APPOINTMENT_CHANGES_LAG_SECONDS are held back so a transaction
+        that commits late can't land behind a cursor that was already handed out.
+        """
+        try:
+            limit = max(1, min(request.args.get("limit", 500, type=int), 1000))
+            cursor = request.args.get("cursor")
+            since = request.args.get("since")
+            since_value = None
+
+            query = Appointment.query
+            branch_id = request.args.get("branch_id")
+            principal = current_principal()
+            if principal and principal.role == "admin":
+                branch_id = principal.branch_id
+            if branch_id:
+                query = query.filter(Appointment.branch_id == branch_id)
+
+            try:
+                if cursor:
+                    updated_at, appointment_id = decode_cursor(cursor)
+                    query = query.filter(keyset_after(Appointment.updated_at, Appointment.appointment_id, updated_at, appointment_id))
+                elif since:
+                    since_value = datetime.fromisoformat(since)
+                    if since_value.tzinfo is None:
+                        since_value = since_value.replace(tzinfo=timezone.utc)
+                    query = query.filter(Appointment.updated_at > since_value)
+            except ValueError:
+                return jsonify({"status": False, "message": "Invalid cursor or since, since must be an ISO timestamp"}), 400
+
+            lag = current_app.config.get("APPOINTMENT_CHANGES_LAG_SECONDS", 2)
+            horizon = datetime.now(timezone.utc) - timedelta(seconds=lag)
+            rows = (
+                query.filter(Appointment.updated_at <= horizon)
+                .order_by(*keyset_order(Appointment.updated_at, Appointment.appointment_id))
+                .limit(limit + 1)
+                .all()
+            )
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            upserts = []
+            tombstones = []
+            for appointment in rows:
+                if appointment.isDeleted:
+                    tombstones.append({
+                        "appointment_id": appointment.appointment_id,
+                        "branch_id": appointment.branch_id,
+                        "version": appointment.version,
+                        "updated_at": appointment.updated_at.isoformat() if appointment.updated_at else None,
+                    })
+                else:
+                    upserts.append(appointment.to_dict())
+
+            # nothing new: keep the client's watermark, or start one at since/the horizon
+            if rows:
+                next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].appointment_id)
+            elif cursor:
+                next_cursor = cursor
+            else:
+                next_cursor = encode_cursor(since_value or horizon, "")
+
+            return jsonify({
+                "status": True,
+                "upserts": upserts,
+                "tombstones": tombstones,
+                "cursor": next_cursor,
+                "has_more": has_more
+            }), 200
+
+        except Exception as e:
+            return jsonify({"status": False, "message": "Internal error", "error": str(e)}), 500
@@ -1,15 +1,15 @@
 from ..models.auth_model import Auth
 from ..models.admin_model import Admin
 from ..models.user_model import User
-from ..models.otp_model import OTP
 from ..models.owner_model import Owner
 from ..models.aesthetician_model import Aesthetician
-from flask import jsonify, request, make_response
+from flask import jsonify, request, make_response, current_app
 from ..extension import db
-from datetime import datetime, timedelta, timezone
-from ..helper.functions import generate_otp, send_email_otp
+from ..helper.functions import send_email_otp
+from ..helper.otp_store import get_otp_store, otp_retry_after, VERIFIED, EXPIRED, LOCKED
 from flask_jwt_extended import create_access_token, create_refresh_token
 from ..controllers.base_crud_controller import BaseCRUDController
+from ..helper.principal import load_principal
 
 
 
@@ -18,7 +18,7 @@ class AuthController(BaseCRUDController):
         super().__init__(
             model=Auth,
             id_field="account_id",
-            
+            eager_loads=[Auth.role]
         )
     
 
@@ -40,32 +40,25 @@ class AuthController(BaseCRUDController):
                     return jsonify({"status": False, "message": "Email already exists"}), 409
                 
                 else:
-                    OTP.query.filter_by(email=data["email"]).delete()                    
-                    
-                    expiration_time = datetime.now(timezone.utc) + timedelta(minutes=5)
-                    otp = generate_otp()
-                    new_otp = OTP(otp_code=otp, expires_at=expiration_time, email=data["email"])
-                    db.session.add(new_otp)
-                    db.session.commit() 
-                    send_email_otp(to_email=data["email"], otp=otp)
+                    limited = self._otp_rate_limited(data["email"])
+                    if limited:
+                        return limited
+                    self._send_otp(data["email"])
                     return jsonify({"status": True, "message": "New OTP sent to email"}), 200
             
+            limited = self._otp_rate_limited(data["email"])
+            if limited:
+                return limited
+            
             new_auth = Auth(**data)
             db.session.add(new_auth)
             db.session.flush()
             
             new_user = User(account_id=new_auth.account_id)
             db.session.add(new_user)
-            db.session.flush()
-            
-            
-            expiration_time = datetime.now(timezone.utc) + timedelta(minutes=5)
-            otp = generate_otp()
-            new_otp = OTP(otp_code=otp, expires_at=expiration_time, email=data["email"])
-            db.session.add(new_otp)
             db.session.commit()
             
-            send_email_otp(to_email=data["email"],otp=otp)
+            self._send_otp(data["email"])
             
             return jsonify({"status": True, "message": "OTP sent to email successfully", "auth":new_auth.to_dict()})
                 
@@ -173,19 +166,12 @@ class AuthController(BaseCRUDController):
             if auth and auth.is_verified:
                 return jsonify({"status": False, "message": "Email already exists"}), 409
 
-            if auth and not auth.is_verified:
-                OTP.query.filter_by(email=data["email"]).delete()
-                db.session.commit()
-
-            # Generate a new OTP
-            expiration_time = datetime.now(timezone.utc) + timedelta(minutes=5)
-            otp = generate_otp()
-
-            new_otp = OTP(otp_code=otp, expires_at=expiration_time, email=data["email"])
-            db.session.add(new_otp)
-            db.session.commit()
+            limited = self._otp_rate_limited(data["email"])
+            if limited:
+                return limited
 
-            send_email_otp(to_email=data["email"], otp=otp)
+            # Issuing replaces any earlier OTP for this email
+            self._send_otp(data["email"])
 
             return jsonify({"status": True, "message": "OTP sent to email successfully"}), 200
 
@@ -205,17 +191,12 @@ class AuthController(BaseCRUDController):
             if not auth:
                 return jsonify({"status": False, "message": "User not found"}), 404
 
-            otp = OTP.query.filter_by(email=data["email"], otp_code=data["otp_code"], is_used=False).first()
-            if not otp:
-                return jsonify({"status": False, "message": "Invalid OTP"}), 400
-
-            # Check expiry
-            if datetime.now(timezone.utc) > otp.expires_at:
-                return jsonify({"status": False, "message": "OTP Expired"}), 400
+            failed = self._check_otp(data["email"], data["otp_code"])
+            if failed:
+                return failed
 
             # Success
             auth.is_verified = True
-            otp.is_used = True
             db.session.commit()
 
             return jsonify({"status": True, "message": "OTP Verified Successfully"}), 200
@@ -237,6 +218,15 @@ class AuthController(BaseCRUDController):
             
             if not auth.check_password(data["password"]):
                 return jsonify({"status": False, "message": "Wrong password"}), 404
+
+            # Upgrade the stored hash to the configured cost while we have the plain password
+            if auth.password_needs_rehash():
+                try:
+                    auth.password = data["password"]
+                    db.session.commit()
+                except Exception as rehash_error:
+                    db.session.rollback()
+                    print(f"Error rehashing password: {str(rehash_error)}")
             
             # Check if the related user record is deleted (for admins/aestheticians)
             try:
@@ -346,19 +336,12 @@ class AuthController(BaseCRUDController):
                 # For security, don't reveal if email exists
                 return jsonify({"status": True, "message": "If email exists, OTP will be sent"}), 200
 
-            # Delete any existing OTP for this email
-            OTP.query.filter_by(email=data["email"]).delete()
-            db.session.commit()
+            limited = self._otp_rate_limited(data["email"])
+            if limited:
+                return limited
 
-            # Generate new OTP
-            expiration_time = datetime.now(timezone.utc) + timedelta(minutes=5)
-            otp = generate_otp()
-
-            new_otp = OTP(otp_code=otp, expires_at=expiration_time, email=data["email"])
-            db.session.add(new_otp)
-            db.session.commit()
-
-            send_email_otp(to_email=data["email"], otp=otp)
+            # Issuing replaces any existing OTP for this email
+            self._send_otp(data["email"])
 
             return jsonify({"status": True, "message": "OTP sent to email successfully"}), 200
 
@@ -385,22 +368,10 @@ class AuthController(BaseCRUDController):
             if not auth:
                 return jsonify({"status": False, "message": "User not found"}), 404
 
-            otp = OTP.query.filter_by(
-                email=data["email"], 
-                otp_code=data["otp_code"], 
-                is_used=False
-            ).first()
-            
-            if not otp:
-                return jsonify({"status": False, "message": "Invalid OTP"}), 400
-
-            # Check expiry
-            if datetime.now(timezone.utc) > otp.expires_at:
-                return jsonify({"status": False, "message": "OTP Expired"}), 400
-
-            # Mark OTP as used
-            otp.is_used = True
-            db.session.commit()
+            # Marks the OTP as used
+            failed = self._check_otp(data["email"], data["otp_code"])
+            if failed:
+                return failed
 
             return jsonify({"status": True, "message": "OTP Verified Successfully"}), 200
 
@@ -423,20 +394,10 @@ class AuthController(BaseCRUDController):
             if not auth:
                 return jsonify({"status": False, "message": "User not found"}), 404
 
-            # Check if there's a recently verified OTP
-            recent_otp = OTP.query.filter_by(
-                email=data["email"],
-                is_used=True
-            ).order_by(OTP.created_at.desc()).first()
-
-            if not recent_otp:
+            # Check there's a verified OTP that hasn't expired yet
+            if not get_otp_store().was_verified(data["email"]):
                 return jsonify({"status": False, "message": "Please verify OTP first"}), 400
 
-            # Double-check OTP hasn't expired (extra security)
-            now = datetime.now(timezone.utc)
-            if now > recent_otp.expires_at:
-                return jsonify({"status": False, "message": "OTP verification expired, please request new OTP"}), 400
-
             # Update password (Auth model automatically hashes it via property setter)
             auth.password = data["new_password"]
             db.session.commit()
@@ -465,19 +426,12 @@ class AuthController(BaseCRUDController):
                 # For security, don't reveal if email exists
                 return jsonify({"status": True, "message": "If email exists, OTP will be sent"}), 200
 
-            # Delete any existing OTP for this email
-            OTP.query.filter_by(email=data["email"]).delete()
-            db.session.commit()
+            limited = self._otp_rate_limited(data["email"])
+            if limited:
+                return limited
 
-            # Generate new OTP
-            expiration_time = datetime.now(timezone.utc) + timedelta(minutes=5)
-            otp = generate_otp()
-
-            new_otp = OTP(otp_code=otp, expires_at=expiration_time, email=data["email"])
-            db.session.add(new_otp)
-            db.session.commit()
-
-            send_email_otp(to_email=data["email"], otp=otp)
+            # Issuing replaces any existing OTP for this email
+            self._send_otp(data["email"])
 
             return jsonify({"status": True, "message": "OTP sent to email successfully"}), 200
 
@@ -500,21 +454,10 @@ class AuthController(BaseCRUDController):
             if not auth:
                 return jsonify({"status": False, "message": "User not found"}), 404
 
-            otp = OTP.query.filter_by(
-                email=data["email"], 
-                otp_code=data["otp_code"], 
-                is_used=False
-            ).first()
-            
-            if not otp:
-                return jsonify({"status": False, "message": "Invalid OTP"}), 400
-
-            # Check expiry
-            if datetime.now(timezone.utc) > otp.expires_at:
-                return jsonify({"status": False, "message": "OTP Expired"}), 400
-
-            # Mark OTP as used
-            otp.is_used = True
+            # Marks the OTP as used
+            failed = self._check_otp(data["email"], data["otp_code"])
+            if failed:
+                return failed
             
             # Mark email as verified
             auth.is_verified = True
@@ -531,6 +474,30 @@ class AuthController(BaseCRUDController):
                 "error": str(e)
             }), 500
     
+    def _otp_rate_limited(self, email):
+        """429 response when the email or the caller's IP has run out of OTP requests, else None"""
+        retry_after = otp_retry_after(email, request.remote_addr)
+        if retry_after:
+            response = jsonify({"status": False, "message": "Too many OTP requests, please try again later", "retry_after": retry_after})
+            response.headers["Retry-After"] = str(retry_after)
+            return response, 429
+        return None
+
+    def _send_otp(self, email):
+        otp = get_otp_store().issue(email)
+        send_email_otp(to_email=email, otp=otp, expiry=current_app.config.get("OTP_TTL_MINUTES", 5))
+
+    def _check_otp(self, email, otp_code):
+        """Verify (and use up) an OTP; returns the error response, or None when it is valid"""
+        result = get_otp_store().verify(email, otp_code)
+        if result == VERIFIED:
+            return None
+        if result == EXPIRED:
+            return jsonify({"status": False, "message": "OTP Expired"}), 400
+        if result == LOCKED:
+            return jsonify({"status": False, "message": "Too many attempts, please request a new OTP"}), 429
+        return jsonify({"status": False, "message": "Invalid OTP"}), 400
+
     def _validate_credentials(self, crendetials):
         required_fields = ["email", "password"]
         for field in required_fields:
@@ -580,28 +547,21 @@ class AuthController(BaseCRUDController):
             from flask_jwt_extended import get_jwt_identity
             
             account_id = get_jwt_identity()
-            auth = Auth.query.get(account_id)
+            principal = load_principal(account_id)
             
-            if not auth:
+            if not principal:
                 return jsonify({"status": False, "message": "Account not found"}), 404
             
-            if auth.isDeleted:
+            if principal.is_deleted:
                 return jsonify({"status": False, "message": "Account has been deleted"}), 403
             
-            # Get role name for the new token
-            try:
-                role_name = auth.role.role_name if auth.role else "unknown"
-            except Exception as role_error:
-                print(f"DEBUG REFRESH - Error getting role: {role_error}")
-                role_name = "unknown"
-            
             # Generate new access token with all claims
             new_access_token = create_access_token(
                 identity=account_id,
                 additional_claims={
-                    "email": auth.email,
-                    "role": role_name,
-                    "is_verified": auth.is_verified
+                    "email": principal.email,
+                    "role": principal.role,
+                    "is_verified": principal.is_verified
                 }
             )
             
@@ -610,7 +570,7 @@ class AuthController(BaseCRUDController):
                 "status": True,
                 "message": "Token refreshed successfully",
                 "access_token": new_access_token,
-                "auth": auth.to_dict()
+                "auth": principal.auth_dict()
             }))
             
             # Get environment-specific cookie settings
@@ -651,26 +611,22 @@ class AuthController(BaseCRUDController):
             if not account_id:
                 return jsonify({"status": False, "message": "Not authenticated"}), 401
             
-            # Get the auth record to verify it still exists and is not deleted
-            auth = Auth.query.get(account_id)
+            # Verify the account still exists and neither it nor its admin record is deleted
+            principal = load_principal(account_id)
             
-            if not auth or auth.isDeleted:
+            if not principal:
                 return jsonify({"status": False, "message": "Account not found or deleted"}), 401
             
-            # Check if related user record is deleted (for admins)
-            if auth.role_id == "2":  # Admin
-                admin = Admin.query.filter_by(account_id=auth.account_id).first()
-                if admin and admin.isDeleted:
-                    return jsonify({"status": False, "message": "Account has been deleted"}), 401
+            if principal.is_deleted:
+                message = "Account has been deleted" if principal.admin_id else "Account not found or deleted"
+                return jsonify({"status": False, "message": message}), 401
             
             # Return user information
-            role_name = auth.role.role_name if auth.role else "unknown"
-            
             return jsonify({
                 "account_id": account_id,
-                "email": claims.get("email", auth.email),
-                "role": role_name,
-                "is_verified": auth.is_verified
+                "email": claims.get("email", principal.email),
+                "role": principal.role,
+                "is_verified": principal.is_verified
             }), 200
             
         except Exception as e:
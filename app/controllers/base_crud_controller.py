@@ -1,11 +1,14 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from ..extension import db
 from sqlalchemy import or_, asc, desc, func
+from sqlalchemy.orm import joinedload, selectinload
 from ..helper.functions import validate_required_fields, convert_formdata_types
-import cloudinary.uploader
+from ..helper.date_range import apply_date_range, parse_date
+from ..helper.uploads import queue_image_upload
+from ..helper.pagination import COUNT_MODES, count_query, decode_cursor, encode_cursor, keyset_after, keyset_order
 
 class BaseCRUDController:
-    def __init__(self, model, id_field, required_fields=None, searchable_fields=None, filterable_fields=None, updatable_fields=None, sortable_fields=None, joins=None):
+    def __init__(self, model, id_field, required_fields=None, searchable_fields=None, filterable_fields=None, updatable_fields=None, sortable_fields=None, joins=None, date_field="created_at", eager_loads=None):
         self.model = model
         self.id_field = id_field
         self.required_fields = required_fields or []
@@ -15,6 +18,10 @@ class BaseCRUDController:
         self.sortable_fields = sortable_fields or {}
         self.resource_name = model.__tablename__
         self.joins = joins or []
+        # column used by the date_from/date_to list filters
+        self.date_field = date_field
+        # relationships to_dict() reads, loaded up front instead of one lazy query per row
+        self.eager_loads = eager_loads or []
     
     # public methods for CRUD operations
     def create(self):
@@ -42,19 +49,21 @@ class BaseCRUDController:
                 db.session.add(new_instance)
             
             # Commit first
+            if image and hasattr(new_instance, "image"):
+                new_instance.image = current_app.config.get("UPLOAD_PLACEHOLDER_IMAGE")
             db.session.commit()
             
-            # Upload image after commit
-            if image:
-                upload_result = cloudinary.uploader.upload(image)
-                new_instance.image = upload_result["secure_url"]
-                db.session.commit()
-            
-            return jsonify({
+            response = {
                 "status": True,
                 "message": f"{self.resource_name} created successfully",
                 self.resource_name: new_instance.to_dict()
-            }), 201
+            }
+            
+            # Upload image in the background, the record is patched (and a socket event sent) when it is stored
+            if image:
+                response["image_upload"] = queue_image_upload(new_instance, image, self.resource_name)
+            
+            return jsonify(response), 201
 
         except ValueError as e:
             db.session.rollback()
@@ -76,7 +85,7 @@ class BaseCRUDController:
     # generic get all method 
     def get_all(self):
         try:
-            query = self.model.query
+            query = self._apply_eager_loads(self.model.query)
             
             if hasattr(self.model, "isDeleted"):
                 query = query.filter(self.model.isDeleted == False)
@@ -87,24 +96,54 @@ class BaseCRUDController:
             
             query = self._apply_filters(query)
             
+            query = self._apply_date_range(query)
+            
+            per_page = int(request.args.get("limit", 12))
+            count_mode = request.args.get("count", "exact")
+            if count_mode not in COUNT_MODES:
+                return jsonify({"status": False, "message": "count must be one of exact, estimate, none"}), 400
+            
+            # opt-in keyset pagination: ?cursor= for the first page, then the returned next_cursor
+            if "cursor" in request.args:
+                return self._get_page_by_cursor(query, request.args.get("cursor"), per_page, count_mode)
+            
             query = self._apply_sorting(query)
             
             page = int(request.args.get("page", 1))
-            per_page = int(request.args.get("limit", 12))
             
-            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-            items = [item.to_dict() for item in pagination.items]
+            if count_mode == "exact":
+                pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+                items = [item.to_dict() for item in pagination.items]
+                
+                return jsonify({
+                    "status": True,
+                    "message": f"{self.resource_name} retrieved successfully",
+                    self.resource_name: items,
+                    "total": pagination.total,
+                    "pages": pagination.pages,
+                    "has_prev": pagination.has_prev,
+                    "has_next": pagination.has_next
+                })
+            
+            # skip the COUNT(*): fetch one extra row to know whether there is a next page
+            rows = query.limit(per_page + 1).offset((max(page, 1) - 1) * per_page).all()
+            total = count_query(query, count_mode)
             
             return jsonify({
                 "status": True,
                 "message": f"{self.resource_name} retrieved successfully",
-                self.resource_name: items,
-                "total": pagination.total,
-                "pages": pagination.pages,
-                "has_prev": pagination.has_prev,
-                "has_next": pagination.has_next
+                self.resource_name: [item.to_dict() for item in rows[:per_page]],
+                "total": total,
+                "pages": -(-total // per_page) if total is not None else None,
+                "has_prev": page > 1,
+                "has_next": len(rows) > per_page
             })
             
+        except ValueError as e:
+            return jsonify({
+                "status": False,
+                "message": str(e)
+            }), 400
         except Exception as e:
             print(str(e))
             db.session.rollback()
@@ -142,22 +181,21 @@ class BaseCRUDController:
                 return jsonify({"status": False, "message": f"{self.resource_name} not found"}), 404
 
             # Update other allowed fields
-            for field in self.updatable_fields:
-                if field in data:
-                    setattr(instance, field, data[field])
-
-            # Update image if uploaded
-            if image:
-                upload_result = cloudinary.uploader.upload(image)
-                instance.image = upload_result["secure_url"]
+            self._apply_updatable_fields(instance, data)
 
             db.session.commit()
 
-            return jsonify({
+            response = {
                 "status": True,
                 "message": f"{self.resource_name} updated successfully",
                 self.resource_name: instance.to_dict()
-            }), 200
+            }
+
+            # Keep the current image until the new one is stored in the background
+            if image:
+                response["image_upload"] = queue_image_upload(instance, image, self.resource_name)
+
+            return jsonify(response), 200
 
         except Exception as e:
             db.session.rollback()
@@ -208,7 +246,7 @@ class BaseCRUDController:
     
     def get_by_id(self, id):
         try:
-            instance = self.model.query.filter(getattr(self.model, self.id_field) == id).filter_by(isDeleted=False).first()
+            instance = self._apply_eager_loads(self.model.query).filter(getattr(self.model, self.id_field) == id).filter_by(isDeleted=False).first()
             if not instance:
                 return jsonify({
                     "status": False,
@@ -232,6 +270,23 @@ class BaseCRUDController:
     
     
     # private methods
+    def _apply_updatable_fields(self, instance, data):
+        for field in self.updatable_fields:
+            if field in data:
+                setattr(instance, field, data[field])
+
+    def _apply_eager_loads(self, query):
+        """
+        Load the declared relationships with the query: joinedload for many-to-one
+        (one extra JOIN, no duplicate rows) and selectinload for collections.
+        """
+        for relationship in self.eager_loads:
+            if relationship.property.uselist:
+                query = query.options(selectinload(relationship))
+            else:
+                query = query.options(joinedload(relationship))
+        return query
+
     def _apply_search(self, query):
         search = request.args.get("query")
         if search and self.searchable_fields:
@@ -274,6 +329,55 @@ class BaseCRUDController:
                     query = query.filter(getattr(self.model, model_field)==value)
         return query
         
+    def _apply_date_range(self, query):
+        column = getattr(self.model, self.date_field, None) if self.date_field else None
+        if column is None:
+            return query
+        return apply_date_range(
+            query,
+            column,
+            date_from=parse_date(request.args.get("date_from")),
+            date_to=parse_date(request.args.get("date_to"))
+        )
+        
+    def _cursor_order(self):
+        """(sort column, direction) used for keyset pages, from ?sort= or the primary key"""
+        sort = request.args.get("sort")
+        if sort:
+            field_name, direction = sort.split(":")
+            column = self.sortable_fields.get(field_name)
+            if column is not None and direction in ("asc", "desc"):
+                return column, direction
+        return getattr(self.model, self.id_field), "asc"
+    
+    def _get_page_by_cursor(self, query, cursor, per_page, count_mode):
+        sort_column, direction = self._cursor_order()
+        key_column = getattr(self.model, self.id_field)
+        
+        total = count_query(query, count_mode)
+        
+        if cursor:
+            sort_value, key_value = decode_cursor(cursor)
+            query = query.filter(keyset_after(sort_column, key_column, sort_value, key_value, direction))
+        
+        rows = query.order_by(*keyset_order(sort_column, key_column, direction)).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        
+        next_cursor = None
+        if has_next:
+            last = rows[-1]
+            next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, self.id_field))
+        
+        return jsonify({
+            "status": True,
+            "message": f"{self.resource_name} retrieved successfully",
+            self.resource_name: [item.to_dict() for item in rows],
+            "total": total,
+            "next_cursor": next_cursor,
+            "has_next": has_next
+        })
+        
     def _apply_sorting(self, query):
         sort = request.args.get("sort")
         if sort:
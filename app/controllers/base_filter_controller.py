@@ -1,4 +1,4 @@
-from sqlalchemy import extract
+from ..helper.date_range import apply_date_range, parse_date
 from flask import request
 
 class BasicFilterAnalyticsController:
@@ -8,7 +8,9 @@ class BasicFilterAnalyticsController:
         return {
             'month': request.args.get("month", type=int),
             'year': request.args.get("year", type=int),
-            'branch_id': request.args.get("branch", type=str)
+            'branch_id': request.args.get("branch", type=str),
+            'date_from': parse_date(request.args.get("date_from")),
+            'date_to': parse_date(request.args.get("date_to"))
         }
 
     @staticmethod
@@ -19,13 +21,10 @@ class BasicFilterAnalyticsController:
         return query
     
     @staticmethod
-    def apply_filter_date(query, model, month=None, year=None):
+    def apply_filter_date(query, model, month=None, year=None, date_from=None, date_to=None):
         """Apply date filtering if model has created_at field"""
         if hasattr(model, "created_at"):
-            if year:
-                query = query.filter(extract("year", model.created_at) == year)
-            if month:
-                query = query.filter(extract("month", model.created_at) == month)
+            query = apply_date_range(query, model.created_at, month=month, year=year, date_from=date_from, date_to=date_to)
         return query
     
     @staticmethod
@@ -36,11 +35,11 @@ class BasicFilterAnalyticsController:
         return query
     
     @staticmethod
-    def apply_basic_filters(query, model, month=None, year=None, branch_id=None):
+    def apply_basic_filters(query, model, month=None, year=None, branch_id=None, date_from=None, date_to=None):
         """Apply all basic filters (no appointment-specific filters)"""
         query = BasicFilterAnalyticsController.apply_not_deleted(query, model)
         query = BasicFilterAnalyticsController.apply_filter_branch(query, model, branch_id)
-        query = BasicFilterAnalyticsController.apply_filter_date(query, model, month, year)
+        query = BasicFilterAnalyticsController.apply_filter_date(query, model, month, year, date_from, date_to)
         return query
     
     @staticmethod
@@ -52,5 +51,7 @@ class BasicFilterAnalyticsController:
             model,
             params['month'], 
             params['year'], 
-            params['branch_id']
+            params['branch_id'],
+            params['date_from'],
+            params['date_to']
         )
\ No newline at end of file
@@ -13,7 +13,8 @@ class BranchController(BaseCRUDController):
             searchable_fields=["branch_name"],
             updatable_fields=["branch_name", "barangay", "city", "province", "region", "lot", "status", "slot_capacity", "opening_time", "closing_time"],
             sortable_fields={"rate": Branch.average_rate},
-            joins=[(Address, Address.address_id == Branch.address_id)]
+            joins=[(Address, Address.address_id == Branch.address_id)],
+            eager_loads=[Branch.address]
         )
         
     def get_branch_name(self):
@@ -1,5 +1,6 @@
-from ..models.appointment_model import Appointment
-from sqlalchemy import extract
+from ..extension import db
+from ..helper.date_range import apply_date_range, parse_date
+from ..helper.analytics_facts import raw_source
 from flask import request
 
 class FilterAnalyticsController:
@@ -9,7 +10,9 @@ class FilterAnalyticsController:
         return {
             'month': request.args.get("month", type=int),
             'year': request.args.get("year", type=int),
-            'branch_id': request.args.get("branch", type=str)
+            'branch_id': request.args.get("branch", type=str),
+            'date_from': parse_date(request.args.get("date_from")),
+            'date_to': parse_date(request.args.get("date_to"))
         }
 
     @staticmethod
@@ -19,42 +22,52 @@ class FilterAnalyticsController:
             query = query.filter(model.isDeleted == False)
         return query
 
+    # source is an AnalyticsSource (appointment_daily_fact or raw appointments), raw by default
     @staticmethod
-    def apply_is_completed(query):
-        return query.filter(Appointment.status == "completed")
+    def apply_is_completed(query, source=None):
+        source = source or raw_source()
+        return query.filter(source.status == "completed")
     
     @staticmethod
-    def apply_filter_date(query, month=None, year=None):
-        if year:
-            query = query.filter(extract("year", Appointment.created_at) == year)
-        if month:
-            query = query.filter(extract("month", Appointment.created_at) == month)
-        return query
+    def apply_filter_date(query, month=None, year=None, date_from=None, date_to=None, source=None):
+        source = source or raw_source()
+        return apply_date_range(query, source.day, month=month, year=year, date_from=date_from, date_to=date_to)
     
     @staticmethod
-    def apply_filter_branch(query, branch_id=None):
+    def apply_filter_branch(query, branch_id=None, source=None):
+        source = source or raw_source()
         if branch_id:
-            query = query.filter(Appointment.branch_id == branch_id)
+            query = query.filter(source.branch_id == branch_id)
         return query
     
     
     @staticmethod
-    def apply_all_filters(query, month=None, year=None, branch_id=None):
-        query = FilterAnalyticsController.apply_is_completed(query)
-        query = FilterAnalyticsController.apply_filter_branch(query, branch_id)
-        query = FilterAnalyticsController.apply_filter_date(query, month, year)
+    def apply_all_filters(query, month=None, year=None, branch_id=None, date_from=None, date_to=None, source=None):
+        query = FilterAnalyticsController.apply_is_completed(query, source)
+        query = FilterAnalyticsController.apply_filter_branch(query, branch_id, source)
+        query = FilterAnalyticsController.apply_filter_date(query, month, year, date_from, date_to, source)
         return query
     
     
     
     @staticmethod
-    def apply_filters_from_request(query):
+    def filtered_rows_query(source=None):
+        """Ungrouped query over the rows apply_filters_from_request selects, e.g. to fingerprint them"""
+        source = source or raw_source()
+        query = FilterAnalyticsController.apply_not_deleted(db.session.query(source.model), source.model)
+        return FilterAnalyticsController.apply_filters_from_request(query, source)
+    
+    @staticmethod
+    def apply_filters_from_request(query, source=None):
         params = FilterAnalyticsController.get_filter_params()
         return FilterAnalyticsController.apply_all_filters(
             query, 
             params['month'], 
             params['year'], 
-            params['branch_id']
+            params['branch_id'],
+            params['date_from'],
+            params['date_to'],
+            source
         )
         
             
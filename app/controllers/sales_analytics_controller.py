@@ -1,17 +1,13 @@
 from ..controllers.filter_analytics_controller import FilterAnalyticsController
 from ..extension import db
 from sqlalchemy import func, extract, case
-from ..models.appointment_model import Appointment
 from ..models.aesthetician_model import Aesthetician
 from ..models.service_model import Service
 from ..models.branch_model import Branch
 from flask import request
-from ..helper.linear_regression_model import linear_regression_model
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.model_selection import train_test_split
-import numpy as np
-import pandas as pd
+from ..helper.analytics_facts import analytics_source
+from ..helper.linear_regression_model import linear_regression_model, accuracy_check
+from ..helper.forecast_cache import cached_forecast
 
 
 class SalesAnalyticsController:
@@ -20,16 +16,17 @@ class SalesAnalyticsController:
     
     def revenue_overtime(self):
         group_by = request.args.get("group-by", default="year")
+        source = analytics_source()
         predict = request.args.get("predict", default="true").lower()=="true"
 
         if group_by == "year":
             query = db.session.query(
-                extract("year", Appointment.created_at).label("year"),
-                func.sum(Appointment.to_pay).label("revenue")
+                extract("year", source.day).label("year"),
+                source.revenue().label("revenue")
             ).group_by("year").order_by("year")
 
         elif group_by == "month":
-            month_num = extract("month", Appointment.created_at)
+            month_num = extract("month", source.day)
 
             query = db.session.query(
                 case(
@@ -46,13 +43,13 @@ class SalesAnalyticsController:
                     (month_num == 11, "November"),
                     (month_num == 12, "December"),
                 ).label("month"),
-                func.sum(Appointment.to_pay).label("revenue"),
+                source.revenue().label("revenue"),
                 month_num.label("month_num")
             ).group_by("month", month_num).order_by(month_num)
 
 
         elif group_by == "weekday":
-            dow = extract("dow", Appointment.created_at)
+            dow = extract("dow", source.day)
             query = db.session.query(
                 case(
                     (dow == 0, "Sunday"),
@@ -64,152 +61,134 @@ class SalesAnalyticsController:
                     (dow == 6, "Saturday"),
                 ).label("weekday"),
                 dow.label("dow_num"),
-                func.sum(Appointment.to_pay).label("revenue")
+                source.revenue().label("revenue")
             ).group_by("weekday", "dow_num").order_by("dow_num")
 
         else: 
             query = db.session.query(
-                Appointment.created_at.label("date"),
-                func.sum(Appointment.to_pay).label("revenue")
+                source.day.label("date"),
+                source.revenue().label("revenue")
             ).group_by("date").order_by("date")
 
-        query = FilterAnalyticsController.apply_is_completed(query)
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        query = FilterAnalyticsController.apply_filters_from_request(query)
-        data = [dict(row._mapping) for row in query.all()]
-        
-        if predict:
-            return linear_regression_model(data, group_by=group_by, y_values="revenue")
-        return data
+        query = FilterAnalyticsController.apply_is_completed(query, source)
+        query = FilterAnalyticsController.apply_not_deleted(query, source.model)
+        query = FilterAnalyticsController.apply_filters_from_request(query, source)
+
+        def compute():
+            data = [dict(row._mapping) for row in query.all()]
+            if predict:
+                return linear_regression_model(data, group_by=group_by, y_values="revenue")
+            return data
+
+        # reuse the last result (skipping the aggregate and the fit) until the completed appointments change
+        filters = dict(FilterAnalyticsController.get_filter_params(), predict=predict)
+        return cached_forecast("revenue", group_by, filters, source, FilterAnalyticsController.filtered_rows_query(source), compute)
     
     def sales_accuracy_check(self):
         group_by = request.args.get("group-by", default="year")
+        source = analytics_source()
 
         if group_by == "year":
             query = db.session.query(
-                extract("year", Appointment.created_at).label("year"),
-                func.sum(Appointment.to_pay).label("revenue")
+                extract("year", source.day).label("year"),
+                source.revenue().label("revenue")
             ).group_by("year").order_by("year")
 
         elif group_by == "month":
             query = db.session.query(
-                extract("month", Appointment.created_at).label("month_num"),
-                func.sum(Appointment.to_pay).label("revenue")
+                extract("month", source.day).label("month_num"),
+                source.revenue().label("revenue")
             ).group_by("month_num").order_by("month_num")
 
         elif group_by == "weekday":
             query = db.session.query(
-                extract("dow", Appointment.created_at).label("dow_num"),
-                func.sum(Appointment.to_pay).label("revenue")
+                extract("dow", source.day).label("dow_num"),
+                source.revenue().label("revenue")
             ).group_by("dow_num").order_by("dow_num")
 
         else:
             query = db.session.query(
-                Appointment.created_at.label("date"),
-                func.sum(Appointment.to_pay).label("revenue")
+                source.day.label("date"),
+                source.revenue().label("revenue")
             ).group_by("date").order_by("date")
 
-        query = FilterAnalyticsController.apply_filters_from_request(query)
+        query = FilterAnalyticsController.apply_filters_from_request(query, source)
         data = [dict(row._mapping) for row in query.all()]
 
-        if not data:
-            return {"metrics": {}}
-
-        df = pd.DataFrame(data)
-
-        # X and y
-        if group_by == "year":
-            X = np.arange(len(df)).reshape(-1, 1)
-        elif group_by == "month":
-            X = df["month_num"].values.reshape(-1, 1)
-        elif group_by == "weekday":
-            X = df["dow_num"].values.reshape(-1, 1)
-        else:
-            X = np.arange(len(df)).reshape(-1, 1)
-
-        y = df["revenue"].values  # fix
-
-        if len(df) > 3:
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
-            model = LinearRegression().fit(X_train, y_train)
-            y_pred = model.predict(X_test)
-
-            mae = mean_absolute_error(y_test, y_pred)
-            mse = mean_squared_error(y_test, y_pred)
-            r2 = r2_score(y_test, y_pred)
-
-            return {"metrics": {"MAE": mae, "MSE": mse, "R2": r2}}
-        else:
-            return {"metrics": {"MAE": None, "MSE": None, "R2": None}}
-
+        return accuracy_check(data, y_values="revenue", group_by=group_by)
 
     def payment_popularity(self):
-        query = db.session.query(Appointment.final_payment_method, func.count(Appointment.appointment_id).label("count")).group_by(Appointment.final_payment_method)
-        query = FilterAnalyticsController.apply_is_completed(query)
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        query = FilterAnalyticsController.apply_filters_from_request(query)
+        source = analytics_source()
+        query = db.session.query(source.payment_method.label("final_payment_method"), source.count().label("count")).group_by(source.payment_method)
+        query = FilterAnalyticsController.apply_is_completed(query, source)
+        query = FilterAnalyticsController.apply_not_deleted(query, source.model)
+        query = FilterAnalyticsController.apply_filters_from_request(query, source)
         return [dict(row._mapping) for row in query.all()]
 
     
     def revenue_by_aesthetician(self):
+        source = analytics_source()
         query = (
             db.session.query(
                 func.concat(Aesthetician.first_name, " ", Aesthetician.last_name).label("aesthetician"),  # live full name
-                func.sum(Appointment.to_pay).label("revenue")
+                source.revenue().label("revenue")
             )
-            .join(Aesthetician, Appointment.aesthetician_id == Aesthetician.aesthetician_id)
+            .select_from(source.model)
+            .join(Aesthetician, source.aesthetician_id == Aesthetician.aesthetician_id)
             .group_by(Aesthetician.first_name, Aesthetician.last_name, Aesthetician.aesthetician_id)
         )
 
-        query = FilterAnalyticsController.apply_is_completed(query)
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        query = FilterAnalyticsController.apply_filters_from_request(query)
+        query = FilterAnalyticsController.apply_is_completed(query, source)
+        query = FilterAnalyticsController.apply_not_deleted(query, source.model)
+        query = FilterAnalyticsController.apply_filters_from_request(query, source)
         query = query.limit(10)
 
         return [dict(row._mapping) for row in query.all()]
 
     
     def revenue_by_service(self):
+        source = analytics_source()
         query = (
             db.session.query(
                 Service.service_name.label("service"),  # live service name
-                func.sum(Appointment.to_pay).label("revenue")
+                source.revenue().label("revenue")
             )
-            .join(Service, Appointment.service_id == Service.service_id)
+            .select_from(source.model)
+            .join(Service, source.service_id == Service.service_id)
             .group_by(Service.service_name, Service.service_id)
         )
 
-        query = FilterAnalyticsController.apply_is_completed(query)
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        query = FilterAnalyticsController.apply_filters_from_request(query)
+        query = FilterAnalyticsController.apply_is_completed(query, source)
+        query = FilterAnalyticsController.apply_not_deleted(query, source.model)
+        query = FilterAnalyticsController.apply_filters_from_request(query, source)
         query = query.limit(10)
 
         return [dict(row._mapping) for row in query.all()]
 
     def revenue_by_branch(self):
+        source = analytics_source()
         query = (
             db.session.query(
                 Branch.branch_name.label("branch"),  # live branch name
-                func.sum(Appointment.to_pay).label("revenue")
+                source.revenue().label("revenue")
             )
-            .join(Branch, Appointment.branch_id == Branch.branch_id)
+            .select_from(source.model)
+            .join(Branch, source.branch_id == Branch.branch_id)
             .group_by(Branch.branch_name, Branch.branch_id)
         )
 
-        query = FilterAnalyticsController.apply_is_completed(query)
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        query = FilterAnalyticsController.apply_filters_from_request(query)
+        query = FilterAnalyticsController.apply_is_completed(query, source)
+        query = FilterAnalyticsController.apply_not_deleted(query, source.model)
+        query = FilterAnalyticsController.apply_filters_from_request(query, source)
         query = query.limit(10)
 
         return [dict(row._mapping) for row in query.all()]
 
     def revenue_by_category(self):
-        query = db.session.query(Appointment.category_snapshot, func.sum(Appointment.to_pay).label("revenue")).group_by(Appointment.category_snapshot)
-        query = FilterAnalyticsController.apply_is_completed(query)
-        query = FilterAnalyticsController.apply_not_deleted(query, Appointment)
-        query = FilterAnalyticsController.apply_filters_from_request(query)
+        source = analytics_source()
+        query = db.session.query(source.category.label("category_snapshot"), source.revenue().label("revenue")).group_by(source.category)
+        query = FilterAnalyticsController.apply_is_completed(query, source)
+        query = FilterAnalyticsController.apply_not_deleted(query, source.model)
+        query = FilterAnalyticsController.apply_filters_from_request(query, source)
         query = query.limit(10)
-        return [dict(row._mapping) for row in query.all()]
-    
-    
-    
\ No newline at end of file
+        return [dict(row._mapping) for row in query.all()]
\ No newline at end of file
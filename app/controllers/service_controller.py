@@ -16,7 +16,7 @@ class ServiceController(BaseCRUDController):
             updatable_fields=["service_name", "branch_id", "discount", "is_sale", "discount_type", "category", "image", "description", "price", "duration"],
             sortable_fields={"price": Service.price, "service": Service.service_name, "rate": Service.average_rate},
             joins=[(Branch, Service.branch_id == Branch.branch_id, "left")],
-    
+            eager_loads=[Service.branch]
         )
     
     def get_service_name(self):
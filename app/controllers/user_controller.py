@@ -8,7 +8,9 @@ from flask_jwt_extended import get_jwt_identity, get_jwt
 from flask import jsonify, request
 from ..extension import db
 from datetime import datetime
-import cloudinary.uploader
+from sqlalchemy import cast, func, literal, null, union_all
+from ..helper.pagination import decode_cursor, encode_cursor, keyset_after, keyset_order
+from ..helper.uploads import queue_image_upload
 
 
 class UserController(BaseCRUDController):
@@ -79,9 +81,8 @@ class UserController(BaseCRUDController):
         try:
             data = request.form.to_dict()
             image = request.files.get("image")
-            if image:
-                upload_result = cloudinary.uploader.upload(image)
-                data["image"] = upload_result["secure_url"]
+            # the image is uploaded in the background below, never taken from the form
+            data.pop("image", None)
                 
             # Update only the allowed fields
             for field in self.updatable_fields:
@@ -90,11 +91,15 @@ class UserController(BaseCRUDController):
             
             db.session.commit()
             
-            return jsonify({
+            response = {
                 "status": True,
                 "message": "user updated successfully",
                 "user": user.to_dict()
-            })
+            }
+            if image:
+                response["image_upload"] = queue_image_upload(user, image, "user")
+            
+            return jsonify(response)
             
         except Exception as e:
             db.session.rollback()
@@ -115,174 +120,126 @@ class UserController(BaseCRUDController):
             sort_by = request.args.get("sort_by", "created_at", type=str)
             order = request.args.get("order", "desc", type=str)  # "asc" or "desc"
             
-            from sqlalchemy import func
-            
-            # Build online customers query - only fetch customers with role_id = "1"
-            online_query = User.query.join(Auth, User.account_id == Auth.account_id).filter(
-                User.isDeleted == False,
-                Auth.role_id == "1"  # Only customers, not admin or owner
+            # Online customers - only users whose account has role_id = "1" (not admin or owner)
+            online_query = (
+                db.session.query(
+                    User.user_id.label("id"),
+                    User.first_name.label("first_name"),
+                    User.last_name.label("last_name"),
+                    User.middle_initial.label("middle_initial"),
+                    User.phone_number.label("phone_number"),
+                    literal("online").label("type"),
+                    User.created_at.label("created_at"),
+                    User.image.label("image")
+                )
+                .join(Auth, User.account_id == Auth.account_id)
+                .filter(User.isDeleted == False, Auth.role_id == "1")
             )
             
-            # Build walk-in customers query
-            walkin_query = WalkIn.query.filter(WalkIn.isDeleted == False)
+            # Walk-in customers
+            walkin_query = (
+                db.session.query(
+                    WalkIn.walk_in_id.label("id"),
+                    WalkIn.first_name.label("first_name"),
+                    WalkIn.last_name.label("last_name"),
+                    WalkIn.middle_initial.label("middle_initial"),
+                    WalkIn.phone_number.label("phone_number"),
+                    literal("walkin").label("type"),
+                    WalkIn.created_at.label("created_at"),
+                    cast(null(), User.image.type).label("image")
+                )
+                .filter(WalkIn.isDeleted == False)
+            )
             
-            # Apply search filter
+            # Apply search filter to both halves
             if search:
-                # Create full name search conditions for online customers
-                online_full_name_with_mi = func.concat(
-                    User.first_name, ' ',
-                    User.middle_initial, '. ',
-                    User.last_name
-                )
-                online_full_name_without_mi = func.concat(
-                    User.first_name, ' ',
-                    User.last_name
-                )
-                
-                online_query = online_query.filter(
-                    db.or_(
-                        User.first_name.ilike(f"%{search}%"),
-                        User.last_name.ilike(f"%{search}%"),
-                        User.phone_number.ilike(f"%{search}%"),
-                        online_full_name_with_mi.ilike(f"%{search}%"),
-                        online_full_name_without_mi.ilike(f"%{search}%")
-                    )
-                )
-                
-                # Create full name search conditions for walk-in customers
-                walkin_full_name_with_mi = func.concat(
-                    WalkIn.first_name, ' ',
-                    WalkIn.middle_initial, '. ',
-                    WalkIn.last_name
-                )
-                walkin_full_name_without_mi = func.concat(
-                    WalkIn.first_name, ' ',
-                    WalkIn.last_name
-                )
-                
-                walkin_query = walkin_query.filter(
-                    db.or_(
-                        WalkIn.first_name.ilike(f"%{search}%"),
-                        WalkIn.last_name.ilike(f"%{search}%"),
-                        WalkIn.phone_number.ilike(f"%{search}%"),
-                        walkin_full_name_with_mi.ilike(f"%{search}%"),
-                        walkin_full_name_without_mi.ilike(f"%{search}%")
-                    )
-                )
+                online_query = online_query.filter(self._customer_search(User, search))
+                walkin_query = walkin_query.filter(self._customer_search(WalkIn, search))
             
             # Filter by customer type
             if customer_type == "online":
-                walkin_query = None
+                parts = [online_query]
             elif customer_type == "walkin":
-                online_query = None
+                parts = [walkin_query]
+            else:
+                parts = [online_query, walkin_query]
             
-            # Get counts before pagination
-            online_count = online_query.count() if online_query else 0
-            walkin_count = walkin_query.count() if walkin_query else 0
-            total_count = online_count + walkin_count
+            # Merge both customer tables into one sortable, pageable subquery
+            merged = union_all(*[part.statement for part in parts]).subquery("customers")
             
-            # Determine sort field and order
+            # Total and per-type counts in a single scan
+            counts = db.session.query(
+                func.count(),
+                func.count().filter(merged.c.type == "online")
+            ).select_from(merged).one()
+            total_count = counts[0]
+            online_count = counts[1]
+            walkin_count = total_count - online_count
+            
+            # Same ordering as before: case-insensitive first name, phone, or created_at with
+            # missing values first; (type, id) breaks ties so pages and cursors are stable
             if sort_by == "name":
-                sort_field_online = User.first_name
-                sort_field_walkin = WalkIn.first_name
+                sort_value = func.lower(func.coalesce(merged.c.first_name, ""))
             elif sort_by == "phone":
-                sort_field_online = User.phone_number
-                sort_field_walkin = WalkIn.phone_number
+                sort_value = func.coalesce(merged.c.phone_number, "")
             else:  # created_at (default)
-                sort_field_online = User.created_at
-                sort_field_walkin = WalkIn.created_at
-            
-            is_descending = order.lower() == "desc"
-            
-            # Apply sorting (without pagination yet)
-            if online_query:
-                if is_descending:
-                    online_query = online_query.order_by(sort_field_online.desc())
-                else:
-                    online_query = online_query.order_by(sort_field_online.asc())
-            
-            if walkin_query:
-                if is_descending:
-                    walkin_query = walkin_query.order_by(sort_field_walkin.desc())
-                else:
-                    walkin_query = walkin_query.order_by(sort_field_walkin.asc())
-            
-            # Fetch all data (we'll paginate after merging)
-            online_customers = online_query.all() if online_query else []
-            walkin_customers = walkin_query.all() if walkin_query else []
-            
-            # Format all customers into a single list
-            all_customers = []
+                sort_value = func.coalesce(merged.c.created_at, literal(datetime(1900, 1, 1)))
+            sort_key = func.concat(merged.c.type, ":", merged.c.id)
+            direction = "desc" if order.lower() == "desc" else "asc"
             
-            for customer in online_customers:
-                all_customers.append({
-                    "id": customer.user_id,
-                    "first_name": customer.first_name,
-                    "last_name": customer.last_name,
-                    "middle_initial": customer.middle_initial,
-                    "phone_number": customer.phone_number,
-                    "type": "online",
-                    "created_at": customer.created_at.isoformat() if customer.created_at else None,
-                    "created_at_raw": customer.created_at,  # For sorting
-                    "image": customer.image
-                })
-            
-            for customer in walkin_customers:
-                all_customers.append({
-                    "id": customer.walk_in_id,
-                    "first_name": customer.first_name,
-                    "last_name": customer.last_name,
-                    "middle_initial": customer.middle_initial,
-                    "phone_number": customer.phone_number,
-                    "type": "walkin",
-                    "created_at": customer.created_at.isoformat() if customer.created_at else None,
-                    "created_at_raw": customer.created_at,  # For sorting
-                    "image": None
-                })
-            
-            # Sort the merged list based on sort_by
-            def safe_sort_key(x):
-                if sort_by == "name":
-                    return (x['first_name'] or '').lower()
-                elif sort_by == "phone":
-                    return x['phone_number'] or ''
-                else:  # created_at
-                    created = x['created_at_raw']
-                    if created is None:
-                        return datetime(1900, 1, 1)
-                    # Remove timezone info if present to avoid comparison issues
-                    if hasattr(created, 'tzinfo') and created.tzinfo is not None:
-                        return created.replace(tzinfo=None)
-                    return created
+            query = db.session.query(
+                *merged.c,
+                sort_value.label("sort_value"),
+                sort_key.label("sort_key")
+            )
             
-            all_customers.sort(key=safe_sort_key, reverse=is_descending)
+            cursor = request.args.get("cursor")
+            if "cursor" in request.args:
+                # keyset pagination: ?cursor= for the first page, then the returned next_cursor
+                if cursor:
+                    cursor_value, cursor_key = decode_cursor(cursor)
+                    query = query.filter(keyset_after(sort_value, sort_key, cursor_value, cursor_key, direction))
+            else:
+                query = query.offset((max(page, 1) - 1) * limit)
             
-            # Apply pagination to the merged list
-            start_idx = (page - 1) * limit
-            end_idx = start_idx + limit
-            customers = all_customers[start_idx:end_idx]
+            rows = query.order_by(*keyset_order(sort_value, sort_key, direction)).limit(limit + 1).all()
+            has_next = len(rows) > limit
+            rows = rows[:limit]
             
-            # Remove the raw created_at field used for sorting
-            for customer in customers:
-                customer.pop('created_at_raw', None)
+            customers = [{
+                "id": row.id,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "middle_initial": row.middle_initial,
+                "phone_number": row.phone_number,
+                "type": row.type,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+                "image": row.image
+            } for row in rows]
             
             # Calculate pagination info
             total_pages = (total_count + limit - 1) // limit
+            pagination = {
+                "page": page,
+                "limit": limit,
+                "total": total_count,
+                "total_pages": total_pages,
+                "online_count": online_count,
+                "walkin_count": walkin_count
+            }
+            if "cursor" in request.args:
+                pagination["has_next"] = has_next
+                pagination["next_cursor"] = encode_cursor(rows[-1].sort_value, rows[-1].sort_key) if has_next else None
             
             return jsonify({
                 "status": True,
                 "message": "Customers retrieved successfully",
                 "customers": customers,
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total": total_count,
-                    "total_pages": total_pages,
-                    "online_count": online_count,
-                    "walkin_count": walkin_count
-                }
+                "pagination": pagination
             }), 200
             
+        except ValueError as e:
+            return jsonify({"status": False, "message": str(e)}), 400
         except Exception as e:
             db.session.rollback()
             print(f"Error in get_all_customers: {str(e)}")
@@ -293,5 +250,15 @@ class UserController(BaseCRUDController):
                 "message": "Internal error",
                 "error": str(e)
             }), 500
-    
-    
+
+    def _customer_search(self, model, search):
+        """Name (with or without middle initial) or phone match on User or WalkIn"""
+        full_name_with_mi = func.concat(model.first_name, ' ', model.middle_initial, '. ', model.last_name)
+        full_name_without_mi = func.concat(model.first_name, ' ', model.last_name)
+        return db.or_(
+            model.first_name.ilike(f"%{search}%"),
+            model.last_name.ilike(f"%{search}%"),
+            model.phone_number.ilike(f"%{search}%"),
+            full_name_with_mi.ilike(f"%{search}%"),
+            full_name_without_mi.ilike(f"%{search}%")
+        )
@@ -0,0 +1,283 @@
+import hashlib
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import event, func, inspect, Integer
+from sqlalchemy.orm import Session
+from ..extension import db
+from .cache import get_cache
+
+
+DIMENSIONS = ("day", "branch_id", "service_id", "aesthetician_id", "category", "payment_method", "status")
+MEASURES = (
+    "appointment_count", "revenue", "discount",
+    "service_rating_sum", "service_rating_count",
+    "branch_rating_sum", "branch_rating_count",
+    "aesthetician_rating_sum", "aesthetician_rating_count",
+)
+
+# appointment attribute feeding each dimension
+DIMENSION_SOURCES = {
+    "day": "created_at",
+    "branch_id": "branch_id",
+    "service_id": "service_id",
+    "aesthetician_id": "aesthetician_id",
+    "category": "category_snapshot",
+    "payment_method": "final_payment_method",
+    "status": "status",
+}
+TRACKED_ATTRIBUTES = tuple(DIMENSION_SOURCES.values()) + (
+    "isDeleted", "to_pay", "discount_snapshot", "service_rating", "branch_rating", "aesthetician_rating"
+)
+
+# appointment_fact_state row written by rebuild_facts()
+FACTS_MARKER = "appointment_daily_fact"
+
+
+def fact_key(dimensions):
+    raw = "|".join("" if dimensions[name] is None else str(dimensions[name]) for name in DIMENSIONS)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _fact_contribution(values):
+    """(dimensions, measures) an appointment adds to the fact table, None if it doesn't count"""
+    if values.get("isDeleted") or values.get("created_at") is None:
+        return None
+
+    dimensions = {name: values.get(source) for name, source in DIMENSION_SOURCES.items()}
+    measures = {
+        "appointment_count": 1,
+        "revenue": float(values.get("to_pay") or 0),
+        "discount": float(values.get("discount_snapshot") or 0),
+    }
+    for target in ("service", "branch", "aesthetician"):
+        rating = values.get(f"{target}_rating")
+        measures[f"{target}_rating_sum"] = float(rating or 0)
+        measures[f"{target}_rating_count"] = 1 if rating is not None else 0
+    return dimensions, measures
+
+
+def _values(appointment, old=False):
+    """Current (or pre-flush when old=True) values of the tracked appointment attributes"""
+    state = inspect(appointment)
+    values = {}
+    for name in TRACKED_ATTRIBUTES:
+        history = state.attrs[name].history
+        if old and history.deleted:
+            values[name] = history.deleted[0]
+        else:
+            values[name] = getattr(appointment, name)
+    return values
+
+
+def _add_delta(deltas, contribution, sign):
+    if contribution is None:
+        return
+    dimensions, measures = contribution
+    key = fact_key(dimensions)
+    row = deltas.get(key)
+    if row is None:
+        row = deltas[key] = dict(dimensions, fact_key=key, **{name: 0 for name in MEASURES})
+    for name, value in measures.items():
+        row[name] += sign * value
+
+
+def apply_fact_deltas(connection, deltas):
+    """Upsert fact rows, adding the measure deltas onto any existing row"""
+    from ..models.appointment_daily_fact_model import AppointmentDailyFact
+
+    rows = [row for row in deltas.values() if any(row[name] for name in MEASURES)]
+    if not rows:
+        return
+    table = AppointmentDailyFact.__table__
+    dialect = connection.dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.fact_key],
+            set_={name: table.c[name] + stmt.excluded[name] for name in MEASURES}
+        )
+        connection.execute(stmt)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            table.update()
+            .where(table.c.fact_key == row["fact_key"])
+            .values({name: table.c[name] + row[name] for name in MEASURES})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(row))
+
+
+@event.listens_for(Session, "after_flush")
+def _update_appointment_facts(session, flush_context):
+    """Fold every flushed appointment insert/update/delete into appointment_daily_fact"""
+    from ..models.appointment_model import Appointment
+
+    deltas = {}
+    for appointment in session.new:
+        if isinstance(appointment, Appointment):
+            _add_delta(deltas, _fact_contribution(_values(appointment)), 1)
+
+    for appointment in session.dirty:
+        if not isinstance(appointment, Appointment):
+            continue
+        state = inspect(appointment)
+        if not any(state.attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES):
+            continue
+        _add_delta(deltas, _fact_contribution(_values(appointment, old=True)), -1)
+        _add_delta(deltas, _fact_contribution(_values(appointment)), 1)
+
+    for appointment in session.deleted:
+        if isinstance(appointment, Appointment):
+            _add_delta(deltas, _fact_contribution(_values(appointment, old=True)), -1)
+
+    if deltas:
+        apply_fact_deltas(session.connection(), deltas)
+
+
+def rebuild_facts():
+    """Recompute appointment_daily_fact from the appointment table, returns the row count"""
+    from ..models.appointment_model import Appointment
+    from ..models.appointment_daily_fact_model import AppointmentDailyFact
+    from ..models.appointment_fact_state_model import AppointmentFactState
+
+    dimension_columns = [getattr(Appointment, source).label(name) for name, source in DIMENSION_SOURCES.items()]
+    rows = (
+        db.session.query(
+            *dimension_columns,
+            func.count(Appointment.appointment_id).label("appointment_count"),
+            func.coalesce(func.sum(Appointment.to_pay), 0).label("revenue"),
+            func.coalesce(func.sum(Appointment.discount_snapshot), 0).label("discount"),
+            func.coalesce(func.sum(Appointment.service_rating), 0).label("service_rating_sum"),
+            func.count(Appointment.service_rating).label("service_rating_count"),
+            func.coalesce(func.sum(Appointment.branch_rating), 0).label("branch_rating_sum"),
+            func.count(Appointment.branch_rating).label("branch_rating_count"),
+            func.coalesce(func.sum(Appointment.aesthetician_rating), 0).label("aesthetician_rating_sum"),
+            func.count(Appointment.aesthetician_rating).label("aesthetician_rating_count"),
+        )
+        .filter(Appointment.isDeleted.isnot(True), Appointment.created_at.isnot(None))
+        .group_by(*[getattr(Appointment, source) for source in DIMENSION_SOURCES.values()])
+        .all()
+    )
+
+    facts = []
+    for row in rows:
+        values = dict(row._mapping)
+        values["fact_key"] = fact_key(values)
+        facts.append(values)
+
+    db.session.query(AppointmentDailyFact).delete(synchronize_session=False)
+    if facts:
+        db.session.execute(AppointmentDailyFact.__table__.insert(), facts)
+    # the marker commits with the facts, analytics switch over only once both are in
+    db.session.merge(AppointmentFactState(name=FACTS_MARKER, rebuilt_at=datetime.now(timezone.utc), fact_rows=len(facts)))
+    get_cache("analytics", max_entries=16, ttl=60).delete("facts_ready")
+    return len(facts)
+
+
+class AnalyticsSource:
+    """
+    Columns and aggregate expressions the analytics controllers query, backed either
+    by appointment_daily_fact or by the raw appointment table.
+    """
+
+    def __init__(self, model, is_fact, day, branch_id, service_id, aesthetician_id, category, payment_method, status, count_measure, revenue, discount):
+        self.model = model
+        self.is_fact = is_fact
+        self.day = day
+        self.branch_id = branch_id
+        self.service_id = service_id
+        self.aesthetician_id = aesthetician_id
+        self.category = category
+        self.payment_method = payment_method
+        self.status = status
+        # appointments represented by one row: 1 for raw appointments, appointment_count for facts
+        self.count_measure = count_measure
+        self._revenue = revenue
+        self._discount = discount
+
+    def count(self):
+        if self.is_fact:
+            return func.coalesce(func.sum(self.count_measure), 0).cast(Integer)
+        return func.count()
+
+    def count_where(self, condition):
+        """count() restricted to rows matching condition, as an aggregate FILTER clause"""
+        if self.is_fact:
+            return func.coalesce(func.sum(self.count_measure).filter(condition), 0).cast(Integer)
+        return func.count().filter(condition)
+
+    def revenue(self):
+        return func.sum(self._revenue)
+
+    def discount(self):
+        return func.sum(self._discount)
+
+
+def raw_source():
+    from ..models.appointment_model import Appointment
+
+    return AnalyticsSource(
+        model=Appointment,
+        is_fact=False,
+        day=Appointment.created_at,
+        branch_id=Appointment.branch_id,
+        service_id=Appointment.service_id,
+        aesthetician_id=Appointment.aesthetician_id,
+        category=Appointment.category_snapshot,
+        payment_method=Appointment.final_payment_method,
+        status=Appointment.status,
+        count_measure=1,
+        revenue=Appointment.to_pay,
+        discount=Appointment.discount_snapshot,
+    )
+
+
+def fact_source():
+    from ..models.appointment_daily_fact_model import AppointmentDailyFact as Fact
+
+    return AnalyticsSource(
+        model=Fact,
+        is_fact=True,
+        day=Fact.day,
+        branch_id=Fact.branch_id,
+        service_id=Fact.service_id,
+        aesthetician_id=Fact.aesthetician_id,
+        category=Fact.category,
+        payment_method=Fact.payment_method,
+        status=Fact.status,
+        count_measure=Fact.appointment_count,
+        revenue=Fact.revenue,
+        discount=Fact.discount,
+    )
+
+
+def _facts_ready():
+    """rebuild_facts() has loaded the fact table, row presence alone may be a partial load"""
+    from ..models.appointment_fact_state_model import AppointmentFactState
+
+    cache = get_cache("analytics", max_entries=16, ttl=60)
+    ready = cache.get("facts_ready")
+    if ready is None:
+        ready = inspect(db.engine).has_table(AppointmentFactState.__tablename__)
+        if ready:
+            ready = db.session.get(AppointmentFactState, FACTS_MARKER) is not None
+        cache.set("facts_ready", ready)
+    return ready
+
+
+def analytics_source():
+    """The fact table when ANALYTICS_SOURCE=facts and it is usable, otherwise the raw appointments"""
+    if current_app.config.get("ANALYTICS_SOURCE", "facts") == "facts":
+        try:
+            if _facts_ready():
+                return fact_source()
+        except Exception as e:
+            print(f"appointment facts unavailable, using raw appointments: {e}")
+    return raw_source()
@@ -0,0 +1,33 @@
+import queue
+
+
+def eventlet_hub():
+    """Requests are served as eventlet greenthreads sharing one OS thread"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    if patcher.is_monkey_patched("thread"):
+        return True
+    from ..extension import socketio
+
+    server = getattr(socketio, "server", None)
+    return server is not None and server.eio.async_mode == "eventlet"
+
+
+def thread_queue():
+    """A queue.Queue on real OS locks, safe to share between OS threads even if eventlet patched them"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return queue.Queue()
+    return patcher.original("queue").Queue()
+
+
+def blocking_get(q):
+    """q.get() (a thread_queue) without stalling the other greenthreads under eventlet"""
+    if eventlet_hub():
+        from eventlet import tpool
+
+        return tpool.execute(q.get)
+    return q.get()
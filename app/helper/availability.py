@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from .cache import get_cache
+
+
+ACTIVE_STATUSES = ["waiting", "on-process", "pending"]
+MINUTES_PER_DAY = 24 * 60
+
+
+def normalize_start(value):
+    """Return a naive datetime for an appointment start_time, or None if it can't be used"""
+    if isinstance(value, str):
+        try:
+            value = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+    return value
+
+
+def appointment_intervals(appointments, default_duration=None):
+    """
+    Convert appointments into (start_minute, duration) pairs relative to midnight.
+    Appointments without a usable duration are skipped unless default_duration is given.
+    """
+    intervals = []
+    for appointment in appointments:
+        start = normalize_start(appointment.start_time)
+        if start is None:
+            continue
+
+        duration = appointment.duration
+        try:
+            duration = int(duration) if duration else 0
+        except (TypeError, ValueError):
+            duration = 0
+        if duration <= 0:
+            if default_duration is None:
+                continue
+            duration = default_duration
+
+        intervals.append((start.hour * 60 + start.minute, duration))
+    return intervals
+
+
+class DayOccupancy:
+    """
+    Minute-granularity occupancy index for a single day.
+
+    Built once from a list of (start_minute, duration) intervals, it answers
+    "how many intervals overlap [start, end)" in O(1) using two prefix arrays:
+    the number of intervals starting before a minute and the number ending at
+    or before a minute.
+    """
+
+    def __init__(self, intervals=(), horizon=MINUTES_PER_DAY):
+        self.horizon = horizon
+        self.intervals = list(intervals)
+
+        starts = [0] * (horizon + 1)
+        ends = [0] * (horizon + 1)
+        for start, duration in self.intervals:
+            if duration <= 0 or start >= horizon:
+                continue
+            end = min(start + duration, horizon)
+            start = max(start, 0)
+            if end <= start:
+                continue
+            starts[start] += 1
+            ends[end] += 1
+
+        # starts_before[m] = intervals with start < m
+        self._starts_before = [0] * (horizon + 1)
+        # ends_through[m] = intervals with end <= m
+        self._ends_through = [0] * (horizon + 1)
+        running_starts = 0
+        running_ends = 0
+        for minute in range(horizon + 1):
+            self._starts_before[minute] = running_starts
+            running_starts += starts[minute]
+            running_ends += ends[minute]
+            self._ends_through[minute] = running_ends
+
+    @classmethod
+    def from_appointments(cls, appointments, default_duration=None, horizon=MINUTES_PER_DAY):
+        return cls(appointment_intervals(appointments, default_duration), horizon=horizon)
+
+    def count(self, start, end):
+        """Number of intervals overlapping the half-open range [start, end)"""
+        start = min(max(start, 0), self.horizon)
+        end = min(max(end, 0), self.horizon)
+        if end <= start:
+            return 0
+        return self._starts_before[end] - self._ends_through[start]
+
+    def is_busy(self, start, end):
+        return self.count(start, end) > 0
+
+
+def build_slots(day, opening_time, closing_time, duration, slot_capacity, now, branch_occupancy, aesthetician_occupancy=None, user_occupancy=None):
+    """
+    Generate the slot list for a day in a single pass.
+
+    Status precedence matches the booking rules: "past", then "conflict" (the
+    user already has an overlapping appointment), then "booked" (aesthetician
+    busy or branch capacity reached), otherwise "available".
+    """
+    day_start = datetime.combine(day, datetime.min.time())
+    shift_start = datetime.combine(day, opening_time)
+    shift_end = datetime.combine(day, closing_time)
+
+    # If closing time is midnight (00:00:00), it means end of day, so add 1 day
+    if closing_time.hour == 0 and closing_time.minute == 0 and closing_time.second == 0:
+        shift_end = shift_end + timedelta(days=1)
+
+    step = timedelta(minutes=duration)
+    slots = []
+    current = shift_start
+
+    while current + step <= shift_end:
+        slot_end = current + step
+        start_minute = int((current - day_start).total_seconds() // 60)
+        end_minute = start_minute + duration
+
+        if current < now:
+            status = "past"
+        elif user_occupancy is not None and user_occupancy.is_busy(start_minute, end_minute):
+            status = "conflict"
+        elif aesthetician_occupancy is not None and aesthetician_occupancy.is_busy(start_minute, end_minute):
+            status = "booked"
+        elif branch_occupancy.count(start_minute, end_minute) >= slot_capacity:
+            status = "booked"
+        else:
+            status = "available"
+
+        slots.append({
+            "start_time": current.strftime("%I:%M %p"),
+            "end_time": slot_end.strftime("%I:%M %p"),
+            "start_time_24": current.strftime("%H:%M"),
+            "end_time_24": slot_end.strftime("%H:%M"),
+            "status": status
+        })
+
+        current = slot_end
+
+    return slots
+
+
+def _availability_cache():
+    return get_cache("availability", max_entries=2048, ttl=current_app.config.get("AVAILABILITY_CACHE_TTL", 30))
+
+
+def _occupancy_key(kind, owner_id, day):
+    return f"{kind}:{owner_id}:{day.isoformat()}"
+
+
+def load_occupancy(kind, owner_id, day, loader, default_duration=None):
+    """
+    Return the DayOccupancy of a branch or aesthetician for a day.
+    The intervals are cached per (kind, owner_id, day); loader() is only called
+    (and the database only hit) on a cache miss.
+    """
+    cache = _availability_cache()
+    key = _occupancy_key(kind, owner_id, day)
+    intervals = cache.get(key)
+    if intervals is None:
+        intervals = appointment_intervals(loader(), default_duration)
+        cache.set(key, intervals)
+    return DayOccupancy([tuple(interval) for interval in intervals])
+
+
+def invalidate_availability(branch_id=None, aesthetician_id=None, start_time=None):
+    """Drop the cached occupancy touched by an appointment on that branch/aesthetician and day"""
+    start = normalize_start(start_time)
+    if start is None:
+        return
+    keys = []
+    if branch_id:
+        keys.append(_occupancy_key("branch", branch_id, start.date()))
+    if aesthetician_id:
+        keys.append(_occupancy_key("aesthetician", aesthetician_id, start.date()))
+    if keys:
+        _availability_cache().delete(*keys)
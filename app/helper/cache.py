@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class LocalCache:
+    """Thread-safe in-process cache with LRU eviction and a per-entry TTL (seconds)"""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            entry = self._data.get(key)
+            now = time.monotonic()
+            if entry is None or (entry[1] is not None and entry[1] <= now):
+                ttl = self.ttl if ttl is None else ttl
+                entry = (0, now + ttl if ttl else None)
+            value = entry[0] + amount
+            self._data[key] = (value, entry[1])
+            self._data.move_to_end(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Shared cache backed by Redis; values are stored as JSON under a namespace prefix"""
+
+    def __init__(self, url, namespace="", ttl=60):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}" if self.namespace else key
+
+    def get(self, key, default=None):
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            return default
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self._key(key), json.dumps(value, default=str), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self._key(key) for key in keys])
+
+    def incr(self, key, amount=1, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        value = self.client.incrby(self._key(key), amount)
+        if ttl and value == amount:
+            # first increment creates the key, give it an expiry
+            self.client.expire(self._key(key), ttl)
+        return value
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self._key("*")):
+            self.client.delete(key)
+
+
+_caches = {}
+
+
+def get_cache(namespace, max_entries=1024, ttl=60):
+    """
+    Return the cache registered for a namespace, creating it on first use.
+    Uses Redis when CACHE_URL is configured, otherwise an in-process LocalCache.
+    """
+    cache = _caches.get(namespace)
+    if cache is None:
+        url = current_app.config.get("CACHE_URL")
+        if url:
+            cache = RedisCache(url, namespace=namespace, ttl=ttl)
+        else:
+            cache = LocalCache(max_entries=max_entries, ttl=ttl)
+        _caches[namespace] = cache
+    return cache
+
+
+def set_cache(namespace, cache):
+    """Plug a specific backend in for a namespace (e.g. a LocalCache in tests)"""
+    _caches[namespace] = cache
@@ -0,0 +1,76 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, extract
+
+
+def day_bounds(day):
+    """Half-open [start, end) datetime range covering a calendar day"""
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def month_bounds(year, month):
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def year_bounds(year):
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def on_day(column, day):
+    """
+    Index-friendly replacement for func.date(column) == day.
+    Compares the raw column against a range so a plain btree index can be used.
+    """
+    start, end = day_bounds(day)
+    return and_(column >= start, column < end)
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD query param, None when empty"""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}'. Use YYYY-MM-DD")
+
+
+def date_range(day=None, month=None, year=None, date_from=None, date_to=None):
+    """
+    Combine date filters into one half-open (start, end) range, either side may be None.
+    date_from/date_to are inclusive days. A month without a year has no single range
+    and is left to apply_date_range.
+    """
+    bounds = []
+    if day:
+        bounds.append((day, day + timedelta(days=1)))
+    if year and month:
+        bounds.append(month_bounds(year, month))
+    elif year:
+        bounds.append(year_bounds(year))
+    if date_from:
+        bounds.append((date_from, None))
+    if date_to:
+        bounds.append((None, date_to + timedelta(days=1)))
+
+    start = max((lower for lower, _ in bounds if lower is not None), default=None)
+    end = min((upper for _, upper in bounds if upper is not None), default=None)
+    return start, end
+
+
+def apply_date_range(query, column, day=None, month=None, year=None, date_from=None, date_to=None):
+    """Filter query with start <= column < end predicates instead of date()/extract() on the column"""
+    start, end = date_range(day=day, month=month, year=year, date_from=date_from, date_to=date_to)
+    if start is not None:
+        query = query.filter(column >= start)
+    if end is not None:
+        query = query.filter(column < end)
+    if month and not year:
+        # the same month across every year can't be expressed as one range
+        query = query.filter(extract("month", column) == month)
+    return query
+
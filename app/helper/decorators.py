@@ -1,7 +1,6 @@
 from functools import wraps
 from flask_jwt_extended import verify_jwt_in_request, get_jwt
 from flask import jsonify, request
-from ..controllers.analytics_summary_controller import AnalyticsSummaryController
 
 
 def access_control(*roles):
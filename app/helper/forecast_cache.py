@@ -0,0 +1,90 @@
+import hashlib
+import json
+from datetime import date
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import func
+from .cache import get_cache
+
+
+def _forecast_cache():
+    return get_cache("forecast", max_entries=256, ttl=current_app.config.get("FORECAST_CACHE_TTL", 3600))
+
+
+def _generation_cache():
+    # kept apart from the results so LRU eviction can never reset the generation
+    return get_cache("forecast_generation", max_entries=1, ttl=0)
+
+
+def _generation():
+    return _generation_cache().get("generation") or 0
+
+
+def _filters_key(filters):
+    raw = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def data_fingerprint(query, source):
+    """
+    (row count, revenue sum, last update) of the rows a forecast is built from; it
+    changes whenever a completed appointment is added, removed or edited.
+    query must already be restricted to the forecast's filters.
+    """
+    columns = [source.count(), func.coalesce(source.revenue(), 0)]
+    if not source.is_fact:
+        columns.append(func.max(source.model.updated_at))
+    row = query.with_entities(*columns).order_by(None).one()
+    return [str(value) for value in row]
+
+
+def _plain(value):
+    """value with dates as ISO strings and Decimal/numpy numbers as floats/ints, as a JSON cache returns it"""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        # numpy scalar
+        return value.item()
+    return value
+
+
+def cached_forecast(metric, group_by, filters, source, filtered_query, compute):
+    """
+    Return compute() for (metric, group_by, filters), reusing the stored result while
+    the data fingerprint is unchanged. The result is normalized before it is stored, so
+    a hit and a miss serialize identically whichever cache backend is used.
+
+    With a shared cache (CACHE_URL) the fingerprint is kept until invalidate_forecasts()
+    runs, so repeat loads skip both the aggregate query and the fit. Without one the
+    generation is per process and can't see other workers' writes, so the cheap
+    fingerprint query is rerun on every load and only the fit is skipped.
+    """
+    cache = _forecast_cache()
+    filters_key = _filters_key(filters)
+
+    if current_app.config.get("CACHE_URL"):
+        fingerprint_key = f"fingerprint:{_generation()}:{source.is_fact}:{filters_key}"
+        fingerprint = cache.get(fingerprint_key)
+        if fingerprint is None:
+            fingerprint = data_fingerprint(filtered_query, source)
+            cache.set(fingerprint_key, fingerprint)
+    else:
+        fingerprint = data_fingerprint(filtered_query, source)
+
+    result_key = f"result:{metric}:{group_by}:{filters_key}:{_filters_key(fingerprint)}"
+    result = cache.get(result_key)
+    if result is None:
+        result = _plain(compute())
+        cache.set(result_key, result)
+    return result
+
+
+def invalidate_forecasts():
+    """Drop the cached fingerprints; call after completed appointments change"""
+    _generation_cache().incr("generation", ttl=0)
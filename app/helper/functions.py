@@ -1,9 +1,6 @@
-import smtplib, ssl, string, random, os
+import string, random
 from datetime import datetime, timezone
-from email.mime.text import MIMEText
-from flask import render_template
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from .mailer import mailer, build_otp_message, smtp_settings
 
 
 def convert_formdata_types(form_data):
@@ -51,34 +48,15 @@ def generate_otp():
 
 
 def send_email_otp(to_email, otp, expiry=10):
-    SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-    SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-    EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-    EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+    settings = smtp_settings()
 
-    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
+    if not settings["address"] or (settings["use_tls"] and not settings["password"]):
         return {"status": False, "message": "Email credentials not configured"}
 
-    # Render the template (just like for Flask pages)
-    html_content = render_template("otp_email.html", otp=otp, expiry=expiry)
-    text_content = f"Your OTP code is: {otp}\nThis code will expire in {expiry} minutes."
-
-    # Build the email
-    message = MIMEMultipart("alternative")
-    message["From"] = f"MY Aesthetics Brow Studio"
-    message["To"] = to_email
-    message["Subject"] = "🔑 Account Verification Code"
-    message.attach(MIMEText(text_content, "plain"))
-    message.attach(MIMEText(html_content, "html"))
-
     try:
-        context = ssl.create_default_context()
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls(context=context)
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            server.send_message(message)
-
-        return {"status": True, "message": f"OTP email sent to {to_email}"}
+        # Render while we still have the request's app context, delivery happens on the mail worker
+        mailer.send(build_otp_message(to_email, otp, expiry))
+        return {"status": True, "message": f"OTP email queued for {to_email}"}
     except Exception as e:
         return {"status": False, "message": str(e)}
 
@@ -1,53 +1,133 @@
-import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
+import math
+
+# numpy is imported inside the functions so importing the analytics controllers
+# (and with them create_app) does not load it until a forecast is requested
+
+MONTH_NAMES = ["January","February","March","April","May","June",
+               "July","August","September","October","November","December"]
+WEEKDAYS = ["Sunday","Monday","Tuesday","Wednesday","Thursday","Friday","Saturday"]
+
+
+def fit_line(x, y):
+    """Closed-form ordinary least squares for y = slope * x + intercept"""
+    import numpy as np
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_mean = x.mean()
+    y_mean = y.mean()
+    x_centered = x - x_mean
+    denominator = np.dot(x_centered, x_centered)
+    # a single distinct x has no slope, predict the mean like LinearRegression does
+    slope = np.dot(x_centered, y - y_mean) / denominator if denominator else 0.0
+    return slope, y_mean - slope * x_mean
+
+
+def predict_line(model, x):
+    import numpy as np
+
+    slope, intercept = model
+    return slope * np.asarray(x, dtype=float) + intercept
+
+
+def regression_metrics(y_true, y_pred):
+    """MAE, MSE and R2 of a prediction; R2 is None when it is undefined (fewer than two points)"""
+    import numpy as np
+
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    residuals = y_true - y_pred
+    mae = float(np.abs(residuals).mean())
+    mse = float(np.square(residuals).mean())
+
+    r2 = None
+    if y_true.size >= 2:
+        ss_res = float(np.square(residuals).sum())
+        ss_tot = float(np.square(y_true - y_true.mean()).sum())
+        if ss_tot:
+            r2 = 1 - ss_res / ss_tot
+        else:
+            r2 = 1.0 if ss_res == 0 else 0.0
+    return {"MAE": mae, "MSE": mse, "R2": r2}
+
+
+def _x_values(data, group_by):
+    """Regressor used for a grouping: bucket number for month/weekday, position otherwise"""
+    import numpy as np
+
+    if group_by == "month":
+        return np.array([float(row["month_num"]) for row in data])
+    if group_by == "weekday":
+        return np.array([float(row["dow_num"]) for row in data])
+    return np.arange(len(data), dtype=float)
+
+
+def _y_values(data, y_values):
+    import numpy as np
+
+    return np.array([float(row[y_values] or 0) for row in data])
+
 
 def linear_regression_model(data, y_values, group_by=None):
+    import numpy as np
+
     if not data:
         return []
 
     for row in data:
         row["type"] = "actual"
 
-    df = pd.DataFrame(data)
+    if group_by not in ("year", "month", "weekday"):
+        return data
 
-    if group_by == "year":
-        X = np.arange(len(df)).reshape(-1, 1)
-        y = df[y_values].values
-        model = LinearRegression().fit(X, y)
+    X = _x_values(data, group_by)
+    model = fit_line(X, _y_values(data, y_values))
 
-        future_X = np.arange(len(df), len(df) + 2).reshape(-1, 1) 
-        future_pred = model.predict(future_X)
+    if group_by == "year":
+        future_X = np.arange(len(data), len(data) + 2)
+        future_pred = predict_line(model, future_X)
 
-        future_years = list(range(int(df["year"].iloc[-1]) + 1, int(df["year"].iloc[-1]) + 3))
+        last_year = int(data[-1]["year"])
+        future_years = list(range(last_year + 1, last_year + 3))
         for year, pred in zip(future_years, future_pred):
             data.append({"year": str(year), y_values: int(pred), "type": "predicted"})
 
     elif group_by == "month":
-        X = df["month_num"].values.reshape(-1, 1)
-        y = df[y_values].values
-        model = LinearRegression().fit(X, y)
+        future_X = np.arange(X.max() + 1, X.max() + 4)
+        future_pred = predict_line(model, future_X)
 
-        future_X = np.arange(df["month_num"].max() + 1, df["month_num"].max() + 4).reshape(-1, 1)
-        future_pred = model.predict(future_X)
-
-        month_names = ["January","February","March","April","May","June",
-                        "July","August","September","October","November","December"]
-        for m, pred in zip(future_X.flatten(), future_pred):
+        for m, pred in zip(future_X, future_pred):
             month_index = int((m - 1)) % 12
-            data.append({"month": month_names[month_index], y_values: int(pred), "type": "predicted"})
+            data.append({"month": MONTH_NAMES[month_index], y_values: int(pred), "type": "predicted"})
 
     elif group_by == "weekday":
-        X = df["dow_num"].values.reshape(-1, 1)
-        y = df[y_values].values
-        model = LinearRegression().fit(X, y)
-
-        future_X = np.arange(df["dow_num"].max() + 1, df["dow_num"].max() + 4).reshape(-1, 1)
-        future_pred = model.predict(future_X)
+        future_X = np.arange(X.max() + 1, X.max() + 4)
+        future_pred = predict_line(model, future_X)
 
-        weekdays = ["Sunday","Monday","Tuesday","Wednesday","Thursday","Friday","Saturday"]
-        for d, pred in zip(future_X.flatten(), future_pred):
+        for d, pred in zip(future_X, future_pred):
             dow_index = int(d) % 7
-            data.append({"weekday": weekdays[dow_index], y_values: int(pred), "type": "predicted"})
+            data.append({"weekday": WEEKDAYS[dow_index], y_values: int(pred), "type": "predicted"})
 
     return data
+
+
+def accuracy_check(data, y_values, group_by=None, test_size=0.2):
+    """
+    Hold out the last test_size share of the buckets (in order), fit on the rest and
+    report MAE/MSE/R2 on the held-out part.
+    """
+    if not data:
+        return {"metrics": {}}
+
+    if len(data) <= 3:
+        return {"metrics": {"MAE": None, "MSE": None, "R2": None}}
+
+    X = _x_values(data, group_by)
+    y = _y_values(data, y_values)
+
+    n_test = math.ceil(len(data) * test_size)
+    n_train = len(data) - n_test
+    model = fit_line(X[:n_train], y[:n_train])
+    y_pred = predict_line(model, X[n_train:])
+
+    return {"metrics": regression_metrics(y[n_train:], y_pred)}
@@ -0,0 +1,191 @@
+import os
+import queue
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from flask import render_template
+
+
+# stand-in for the OTP while the template is pre-rendered; survives HTML escaping
+OTP_PLACEHOLDER = "__OTP_CODE__"
+
+
+def smtp_settings():
+    """
+    SMTP settings from the environment. Point SMTP_SERVER/SMTP_PORT at a local debugging
+    server (e.g. `python -m aiosmtpd -n -l localhost:1025`) with SMTP_USE_TLS=False to
+    inspect outgoing mail without sending it.
+    """
+    return {
+        "server": os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+        "port": int(os.getenv("SMTP_PORT", 587)),
+        "use_tls": os.getenv("SMTP_USE_TLS", "True") == "True",
+        "address": os.getenv("EMAIL_ADDRESS"),
+        "password": os.getenv("EMAIL_PASSWORD"),
+    }
+
+
+class SMTPConnection:
+    """One persistent SMTP session, reopened (STARTTLS + login) only when it has dropped"""
+
+    def __init__(self, settings, idle_timeout=60):
+        self.settings = settings
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0
+
+    def _open(self):
+        server = smtplib.SMTP(self.settings["server"], self.settings["port"], timeout=30)
+        if self.settings["use_tls"]:
+            server.starttls(context=ssl.create_default_context())
+        if self.settings["password"]:
+            server.login(self.settings["address"], self.settings["password"])
+        return server
+
+    def _alive(self):
+        if self._server is None or time.monotonic() - self._last_used > self.idle_timeout:
+            return False
+        try:
+            return self._server.noop()[0] == 250
+        except OSError:
+            return False
+
+    def send(self, message):
+        if not self._alive():
+            self.close()
+            self._server = self._open()
+        try:
+            self._server.send_message(message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout, ssl.SSLError):
+            # the server dropped us between the NOOP and the send; retry once on a fresh session.
+            # Every SMTPException is an OSError too, so refusals must not be caught here
+            self.close()
+            self._server = self._open()
+            self._server.send_message(message)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+def _is_permanent(error):
+    """A 5xx refusal (bad sender/recipient, rejected message) that no retry can fix"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class Mailer:
+    """
+    In-process outbound mail queue. Requests only enqueue; worker threads (green threads
+    under eventlet) drain the queue in batches over pooled SMTP connections, retrying
+    failed messages with exponential backoff; 5xx refusals are dropped, not retried.
+    """
+
+    def __init__(self, workers=1, batch_size=20, max_retries=3, backoff=2.0):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"mailer-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def send(self, message):
+        """Queue a message for delivery and return immediately"""
+        self._start()
+        self._queue.put((message, 0))
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        connection = SMTPConnection(smtp_settings())
+        while True:
+            batch = self._next_batch()
+            for message, attempt in batch:
+                try:
+                    connection.send(message)
+                except Exception as e:
+                    if _is_permanent(e):
+                        print(f"Email to {message['To']} rejected, not retrying: {e}")
+                        continue
+                    connection.close()
+                    self._retry(message, attempt, e)
+                finally:
+                    self._queue.task_done()
+
+    def _retry(self, message, attempt, error):
+        if attempt + 1 >= self.max_retries:
+            print(f"Email to {message['To']} failed after {attempt + 1} attempts: {error}")
+            return
+        delay = self.backoff * (2 ** attempt)
+        print(f"Email to {message['To']} failed ({error}), retrying in {delay}s")
+        timer = threading.Timer(delay, self._queue.put, args=((message, attempt + 1),))
+        timer.daemon = True
+        timer.start()
+
+    def flush(self, timeout=None):
+        """Block until every queued message has been handled (for scripts and tests)"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while self._queue.unfinished_tasks:
+            if deadline and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+
+mailer = Mailer(
+    workers=int(os.getenv("MAIL_WORKERS", 1)),
+    batch_size=int(os.getenv("MAIL_BATCH_SIZE", 20)),
+    max_retries=int(os.getenv("MAIL_MAX_RETRIES", 3)),
+    backoff=float(os.getenv("MAIL_RETRY_BACKOFF", 2)),
+)
+
+_otp_templates = {}
+
+
+def otp_email_html(otp, expiry):
+    """otp_email.html rendered once per expiry, then only the code is substituted"""
+    template = _otp_templates.get(expiry)
+    if template is None:
+        template = render_template("otp_email.html", otp=OTP_PLACEHOLDER, expiry=expiry)
+        _otp_templates[expiry] = template
+    return template.replace(OTP_PLACEHOLDER, otp)
+
+
+def build_otp_message(to_email, otp, expiry=10):
+    html_content = otp_email_html(otp, expiry)
+    text_content = f"Your OTP code is: {otp}\nThis code will expire in {expiry} minutes."
+
+    message = MIMEMultipart("alternative")
+    message["From"] = f"MY Aesthetics Brow Studio"
+    message["To"] = to_email
+    message["Subject"] = "🔑 Account Verification Code"
+    message.attach(MIMEText(text_content, "plain"))
+    message.attach(MIMEText(html_content, "html"))
+    return message
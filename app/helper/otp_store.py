@@ -0,0 +1,197 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from ..extension import db
+from .cache import LocalCache, get_cache
+from .functions import generate_otp
+
+
+# outcomes of OTPStore.verify
+VERIFIED = "verified"
+INVALID = "invalid"
+EXPIRED = "expired"
+LOCKED = "locked"
+
+
+def _settings():
+    config = current_app.config
+    return config.get("OTP_TTL_MINUTES", 5), config.get("OTP_MAX_ATTEMPTS", 5)
+
+
+class CacheOTPStore:
+    """
+    OTPs as expiring key/value entries: one get per verification and nothing left behind
+    to purge. Backed by a LocalCache (single node) or the shared CACHE_URL backend.
+    Attempts and single use are enforced with atomic incr, so concurrent verifications
+    of one code can't both succeed.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def issue(self, email):
+        ttl_minutes, _ = _settings()
+        otp = generate_otp()
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=ttl_minutes)
+        # the nonce scopes the attempt/use counters to this code, a reissue starts them fresh
+        self.cache.set(f"otp:{email}", {
+            "code": otp,
+            "nonce": uuid.uuid4().hex,
+            "expires_at": expires_at.timestamp(),
+        }, ttl=ttl_minutes * 60)
+        self.cache.delete(f"verified:{email}")
+        return otp
+
+    def verify(self, email, code):
+        ttl_minutes, max_attempts = _settings()
+        entry = self.cache.get(f"otp:{email}")
+        if entry is None:
+            return INVALID
+        remaining = entry["expires_at"] - datetime.now(timezone.utc).timestamp()
+        if remaining <= 0:
+            return EXPIRED
+
+        if self.cache.incr(f"attempts:{entry['nonce']}", ttl=ttl_minutes * 60) > max_attempts:
+            return LOCKED
+        if code != entry["code"]:
+            return INVALID
+        if self.cache.incr(f"used:{entry['nonce']}", ttl=ttl_minutes * 60) != 1:
+            return INVALID
+
+        self.cache.delete(f"otp:{email}")
+        self.cache.set(f"verified:{email}", True, ttl=max(1, int(remaining)))
+        return VERIFIED
+
+    def was_verified(self, email):
+        """A code for email was verified and its validity window hasn't ended"""
+        return bool(self.cache.get(f"verified:{email}"))
+
+    def purge_expired(self, batch_size=1000):
+        # entries expire by themselves
+        return 0
+
+
+class SQLOTPStore:
+    """OTPs in the otp table; issue replaces the email's codes in one transaction"""
+
+    def issue(self, email):
+        from ..models.otp_model import OTP
+
+        ttl_minutes, _ = _settings()
+        otp = generate_otp()
+        OTP.query.filter_by(email=email).delete(synchronize_session=False)
+        db.session.add(OTP(
+            otp_code=otp,
+            email=email,
+            expires_at=datetime.now(timezone.utc) + timedelta(minutes=ttl_minutes),
+        ))
+        db.session.commit()
+        return otp
+
+    def verify(self, email, code):
+        from ..models.otp_model import OTP
+
+        _, max_attempts = _settings()
+        otp = (
+            OTP.query.filter_by(email=email, is_used=False)
+            .order_by(OTP.created_at.desc())
+            .first()
+        )
+        if otp is None:
+            return INVALID
+        if (otp.attempts or 0) >= max_attempts:
+            return LOCKED
+        if datetime.now(timezone.utc) > otp.expires_at:
+            return EXPIRED
+
+        if code != otp.otp_code:
+            OTP.query.filter_by(otp_id=otp.otp_id).update(
+                {OTP.attempts: OTP.attempts + 1}, synchronize_session=False
+            )
+            db.session.commit()
+            return INVALID
+
+        # conditional update: only one concurrent verification can flip is_used
+        used = OTP.query.filter_by(otp_id=otp.otp_id, is_used=False).update(
+            {OTP.is_used: True}, synchronize_session=False
+        )
+        db.session.commit()
+        return VERIFIED if used else INVALID
+
+    def was_verified(self, email):
+        from ..models.otp_model import OTP
+
+        return db.session.query(OTP.otp_id).filter(
+            OTP.email == email,
+            OTP.is_used.is_(True),
+            OTP.expires_at > datetime.now(timezone.utc),
+        ).first() is not None
+
+    def purge_expired(self, batch_size=1000):
+        """Delete expired rows in batches of batch_size, returns the number deleted"""
+        from ..models.otp_model import OTP
+
+        deleted = 0
+        now = datetime.now(timezone.utc)
+        while True:
+            batch = db.session.query(OTP.otp_id).filter(OTP.expires_at < now).limit(batch_size).subquery()
+            count = OTP.query.filter(OTP.otp_id.in_(db.session.query(batch.c.otp_id))).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+
+_stores = {}
+
+
+def get_otp_store():
+    """
+    Store selected by OTP_BACKEND: "sql" (otp table), "memory" (this process only)
+    or "cache" (the CACHE_URL backend, shared between workers).
+    """
+    backend = current_app.config.get("OTP_BACKEND", "sql")
+    store = _stores.get(backend)
+    if store is None:
+        if backend == "sql":
+            store = SQLOTPStore()
+        elif backend == "memory":
+            store = CacheOTPStore(LocalCache(max_entries=100000, ttl=0))
+        elif backend == "cache":
+            store = CacheOTPStore(get_cache("otp", max_entries=100000, ttl=0))
+        else:
+            raise ValueError(f"Unknown OTP backend '{backend}'")
+        _stores[backend] = store
+    return store
+
+
+_buckets = {}
+
+
+def _bucket(kind):
+    from .rate_limit import TokenBucket
+
+    bucket = _buckets.get(kind)
+    if bucket is None:
+        config = current_app.config
+        bucket = TokenBucket(
+            f"otp_rate_{kind}",
+            capacity=config.get(f"OTP_{kind.upper()}_BURST", 3),
+            refill_seconds=config.get(f"OTP_{kind.upper()}_REFILL_SECONDS", 60),
+        )
+        _buckets[kind] = bucket
+    return bucket
+
+
+def otp_retry_after(email, ip):
+    """
+    Take a token from the email's and the IP's OTP buckets. Returns 0 when an OTP may be
+    issued, otherwise the seconds to wait before asking again.
+    """
+    for kind, key in (("email", email), ("ip", ip)):
+        if key is None:
+            continue
+        bucket = _bucket(kind)
+        if not bucket.allow(key):
+            return max(1, int(bucket.retry_after(key)) + 1)
+    return 0
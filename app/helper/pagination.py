@@ -0,0 +1,111 @@
+import base64
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from sqlalchemy import and_, or_, asc, desc
+from ..extension import db
+
+
+COUNT_MODES = ("exact", "estimate", "none")
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {"t": "datetime", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {"t": "date", "v": value.isoformat()}
+    if isinstance(value, time):
+        return {"t": "time", "v": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"t": "decimal", "v": str(value)}
+    return {"t": "raw", "v": value}
+
+
+def _load_value(data):
+    kind, value = data.get("t"), data.get("v")
+    if value is None:
+        return None
+    if kind == "datetime":
+        return datetime.fromisoformat(value)
+    if kind == "date":
+        return date.fromisoformat(value)
+    if kind == "time":
+        return time.fromisoformat(value)
+    if kind == "decimal":
+        return Decimal(value)
+    return value
+
+
+def encode_cursor(sort_value, key_value):
+    """Opaque cursor pointing just after the row with (sort_value, key_value)"""
+    payload = json.dumps({"s": _dump_value(sort_value), "k": _dump_value(key_value)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (sort_value, key_value) from encode_cursor, raises ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return _load_value(payload["s"]), _load_value(payload["k"])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_order(sort_column, key_column, direction="asc"):
+    """ORDER BY clause matching keyset_after; NULL sort values always come last"""
+    order = desc if direction == "desc" else asc
+    return order(sort_column).nullslast(), order(key_column)
+
+
+def keyset_after(sort_column, key_column, sort_value, key_value, direction="asc"):
+    """
+    Predicate selecting the rows that come after (sort_value, key_value) in
+    keyset_order, so the next page is a plain indexed range scan instead of an OFFSET.
+    """
+    if sort_column is key_column:
+        return key_column < key_value if direction == "desc" else key_column > key_value
+
+    after_key = key_column < key_value if direction == "desc" else key_column > key_value
+    if sort_value is None:
+        # already inside the NULLS LAST tail
+        return and_(sort_column.is_(None), after_key)
+
+    after_sort = sort_column < sort_value if direction == "desc" else sort_column > sort_value
+    return or_(
+        after_sort,
+        and_(sort_column == sort_value, after_key),
+        sort_column.is_(None)
+    )
+
+
+def estimate_count(query):
+    """
+    Planner row estimate for query from Postgres EXPLAIN; constant time regardless of
+    table size. Falls back to an exact count on other databases or if EXPLAIN fails.
+    """
+    statement = query.order_by(None).statement
+    bind = db.session.get_bind()
+    if bind.dialect.name == "postgresql":
+        try:
+            compiled = statement.compile(dialect=bind.dialect)
+            # separate connection so a failed EXPLAIN can't abort the request's transaction
+            with bind.connect() as connection:
+                plan = connection.exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+                ).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except Exception as e:
+            print(f"count estimate failed, using exact count: {e}")
+    return query.order_by(None).count()
+
+
+def count_query(query, mode):
+    """Total rows for count=exact|estimate|none (None when not counted)"""
+    if mode == "none":
+        return None
+    if mode == "estimate":
+        return estimate_count(query)
+    return query.order_by(None).count()
@@ -0,0 +1,48 @@
+import os
+from bcrypt import hashpw, checkpw, gensalt
+from .async_mode import eventlet_hub
+
+
+def _bcrypt_rounds():
+    try:
+        from flask import current_app
+
+        return int(current_app.config.get("BCRYPT_ROUNDS", 12))
+    except RuntimeError:
+        # outside an app context (scripts, seeders)
+        return int(os.getenv("BCRYPT_ROUNDS", 12))
+
+
+def _offload(func, *args):
+    """
+    Run func(*args) without stalling other requests. Under eventlet a blocking call
+    would hold up every greenthread, so it goes through eventlet's OS thread pool.
+    Otherwise each request has its own thread and bcrypt releases the GIL while it
+    hashes, so calling it inline already lets the others run.
+    """
+    if eventlet_hub():
+        from eventlet import tpool
+
+        return tpool.execute(func, *args)
+    return func(*args)
+
+
+def hash_password(password, rounds=None):
+    rounds = rounds or _bcrypt_rounds()
+    return _offload(hashpw, password.encode("utf-8"), gensalt(rounds)).decode("utf-8")
+
+
+def check_password(password, hashed):
+    return _offload(checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def hash_rounds(hashed):
+    """Cost factor stored in a bcrypt hash ("$2b$12$..." -> 12), None if it isn't one"""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed):
+    return hash_rounds(hashed) != _bcrypt_rounds()
@@ -0,0 +1,153 @@
+from dataclasses import dataclass, asdict
+from flask import current_app, g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..extension import db
+from .cache import get_cache
+
+
+@dataclass
+class Principal:
+    """Who an account_id is: auth state, role and the ids of its profile rows"""
+
+    account_id: str
+    email: str
+    role_id: str
+    role: str
+    is_verified: bool
+    is_deleted: bool
+    user_id: str = None
+    admin_id: str = None
+    owner_id: str = None
+    branch_id: str = None
+    created_at: str = None
+    updated_at: str = None
+
+    def auth_dict(self):
+        """Same shape as Auth.to_dict()"""
+        return {
+            "account_id": self.account_id,
+            "email": self.email,
+            "role": self.role,
+            "is_verified": self.is_verified,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+def _principal_cache():
+    return get_cache("principal", max_entries=4096, ttl=current_app.config.get("PRINCIPAL_CACHE_TTL", 60))
+
+
+def _load(account_id):
+    """Auth, role and profile ids of an account in a single query"""
+    from ..models.auth_model import Auth
+    from ..models.role_model import Role
+    from ..models.user_model import User
+    from ..models.admin_model import Admin
+    from ..models.owner_model import Owner
+
+    row = (
+        db.session.query(
+            Auth.account_id, Auth.email, Auth.role_id, Role.role_name, Auth.is_verified, Auth.isDeleted,
+            Auth.created_at, Auth.updated_at,
+            User.user_id, Admin.admin_id, Admin.branch_id, Admin.isDeleted.label("admin_deleted"), Owner.owner_id
+        )
+        .outerjoin(Role, Role.role_id == Auth.role_id)
+        .outerjoin(User, User.account_id == Auth.account_id)
+        .outerjoin(Admin, Admin.account_id == Auth.account_id)
+        .outerjoin(Owner, Owner.account_id == Auth.account_id)
+        .filter(Auth.account_id == account_id)
+        .first()
+    )
+    if row is None:
+        return None
+
+    return Principal(
+        account_id=row.account_id,
+        email=row.email,
+        role_id=row.role_id,
+        role=row.role_name or "unknown",
+        is_verified=bool(row.is_verified),
+        is_deleted=bool(row.isDeleted) or bool(row.admin_deleted),
+        user_id=row.user_id,
+        admin_id=row.admin_id,
+        owner_id=row.owner_id,
+        branch_id=row.branch_id,
+        created_at=row.created_at.isoformat() if row.created_at else None,
+        updated_at=row.updated_at.isoformat() if row.updated_at else None,
+    )
+
+
+def load_principal(account_id):
+    """
+    Principal for account_id, or None if the account doesn't exist. Memoized for the
+    request in flask.g and across requests for PRINCIPAL_CACHE_TTL seconds.
+    """
+    if not account_id:
+        return None
+
+    loaded = g.setdefault("principals", {})
+    if account_id in loaded:
+        return loaded[account_id]
+
+    cache = _principal_cache()
+    cached = cache.get(account_id)
+    if cached is not None:
+        principal = Principal(**cached)
+    else:
+        principal = _load(account_id)
+        if principal is not None:
+            cache.set(account_id, asdict(principal))
+
+    loaded[account_id] = principal
+    return principal
+
+
+def current_principal():
+    """Principal of the JWT in the current request (None without a valid identity)"""
+    from flask_jwt_extended import get_jwt_identity
+
+    return load_principal(get_jwt_identity())
+
+
+def invalidate_principal(*account_ids):
+    account_ids = [account_id for account_id in account_ids if account_id]
+    if not account_ids:
+        return
+    _principal_cache().delete(*account_ids)
+    loaded = g.get("principals") if g else None
+    if loaded:
+        for account_id in account_ids:
+            loaded.pop(account_id, None)
+
+
+# Any flushed change to an account or its profile rows drops its cached principal once
+# the transaction commits, so deletes, role changes and profile edits are seen at once
+@event.listens_for(Session, "after_flush")
+def _collect_principal_changes(session, flush_context):
+    from ..models.auth_model import Auth
+    from ..models.user_model import User
+    from ..models.admin_model import Admin
+    from ..models.owner_model import Owner
+
+    changed = session.info.setdefault("principal_changes", set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, (Auth, User, Admin, Owner)):
+            changed.add(instance.account_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_principals(session):
+    changed = session.info.pop("principal_changes", None)
+    if changed:
+        try:
+            invalidate_principal(*changed)
+        except RuntimeError:
+            # committed outside an app context, nothing could have been cached here
+            pass
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_changes(session):
+    session.info.pop("principal_changes", None)
@@ -0,0 +1,49 @@
+import threading
+import time
+from .cache import get_cache
+
+
+class TokenBucket:
+    """
+    Token bucket per key: up to capacity requests at once, refilled by one token every
+    refill_seconds. State lives in the namespace's cache, so with CACHE_URL it is shared
+    between workers (reads and writes are not transactional there, so it is approximate
+    under contention); the lock makes it exact within a process.
+    """
+
+    def __init__(self, namespace, capacity, refill_seconds):
+        self.namespace = namespace
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self._lock = threading.Lock()
+
+    def _cache(self):
+        # an idle bucket is full again after capacity * refill_seconds, no need to keep it longer
+        return get_cache(self.namespace, max_entries=10000, ttl=int(self.capacity * self.refill_seconds) + 1)
+
+    def allow(self, key, cost=1):
+        """Take cost tokens for key; False when there aren't enough"""
+        cache = self._cache()
+        with self._lock:
+            now = time.time()
+            state = cache.get(key)
+            if state is None:
+                tokens = self.capacity
+            else:
+                tokens, updated_at = state
+                tokens = min(self.capacity, tokens + (now - updated_at) / self.refill_seconds)
+
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            cache.set(key, [tokens, now])
+            return allowed
+
+    def retry_after(self, key, cost=1):
+        """Seconds until key has cost tokens again"""
+        state = self._cache().get(key)
+        if state is None:
+            return 0
+        tokens, updated_at = state
+        tokens = min(self.capacity, tokens + (time.time() - updated_at) / self.refill_seconds)
+        return max(0, (cost - tokens) * self.refill_seconds)
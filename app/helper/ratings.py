@@ -0,0 +1,127 @@
+from sqlalchemy import case, cast, event, func, inspect, update, Numeric
+from sqlalchemy.orm import Session
+from ..extension import db
+
+
+def rating_delta(old, new):
+    """(sum delta, count delta) for a rating changing from old to new, either may be None"""
+    old = float(old) if old is not None else None
+    new = float(new) if new is not None else None
+    delta_sum = (new or 0) - (old or 0)
+    delta_count = (new is not None) - (old is not None)
+    return delta_sum, delta_count
+
+
+def apply_rating_delta(target_model, target_id_field, target_id, old, new, connection=None):
+    """
+    Fold one rating change into the target's rating_sum/rating_count and refresh
+    average_rate in a single UPDATE, without rescanning its appointments.
+    Runs on connection when given (inside a flush), otherwise on the session. Does not commit.
+    """
+    if target_id is None:
+        return
+    delta_sum, delta_count = rating_delta(old, new)
+    if not delta_sum and not delta_count:
+        return
+
+    new_sum = target_model.rating_sum + delta_sum
+    new_count = target_model.rating_count + delta_count
+    stmt = (
+        update(target_model.__table__)
+        .where(target_id_field == target_id)
+        .values(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            average_rate=case(
+                (new_count > 0, func.round(cast(new_sum / new_count, Numeric), 2)),
+                else_=0
+            )
+        )
+    )
+    (connection or db.session).execute(stmt)
+
+
+def _rating_targets():
+    """(appointment rating attribute, appointment fk attribute, target model, target id column)"""
+    from ..models.branch_model import Branch
+    from ..models.service_model import Service
+    from ..models.aesthetician_model import Aesthetician
+
+    return (
+        ("branch_rating", "branch_id", Branch, Branch.branch_id),
+        ("service_rating", "service_id", Service, Service.service_id),
+        ("aesthetician_rating", "aesthetician_id", Aesthetician, Aesthetician.aesthetician_id),
+    )
+
+
+def _value(appointment, name, old=False):
+    history = inspect(appointment).attrs[name].history
+    if old and history.deleted:
+        return history.deleted[0]
+    return getattr(appointment, name)
+
+
+# Every flushed appointment insert/update/delete folds its rating changes into the
+# totals, so review submissions, admin/owner edits and moves between branches,
+# services or aestheticians all keep them in step
+@event.listens_for(Session, "after_flush")
+def _update_rating_totals(session, flush_context):
+    from ..models.appointment_model import Appointment
+
+    changes = []
+    for appointment in session.new:
+        if isinstance(appointment, Appointment):
+            changes.append((None, appointment))
+    for appointment in session.dirty:
+        if isinstance(appointment, Appointment):
+            changes.append((appointment, appointment))
+    for appointment in session.deleted:
+        if isinstance(appointment, Appointment):
+            changes.append((appointment, None))
+    if not changes:
+        return
+
+    connection = session.connection()
+    for rating_field, fk_field, target_model, target_id_field in _rating_targets():
+        for before, after in changes:
+            old_id = _value(before, fk_field, old=True) if before is not None else None
+            old_rating = _value(before, rating_field, old=True) if before is not None else None
+            new_id = getattr(after, fk_field) if after is not None else None
+            new_rating = getattr(after, rating_field) if after is not None else None
+            if old_id == new_id:
+                apply_rating_delta(target_model, target_id_field, new_id, old_rating, new_rating, connection)
+            else:
+                apply_rating_delta(target_model, target_id_field, old_id, old_rating, None, connection)
+                apply_rating_delta(target_model, target_id_field, new_id, None, new_rating, connection)
+
+
+def backfill_ratings(target_model, target_id_field, appointment_fk_field, appointment_rating_field):
+    """Recompute rating_sum/rating_count/average_rate of every target from its appointments"""
+    from ..models.appointment_model import Appointment
+
+    totals = (
+        db.session.query(
+            appointment_fk_field,
+            func.coalesce(func.sum(appointment_rating_field), 0),
+            func.count(appointment_rating_field)
+        )
+        .select_from(Appointment)
+        .filter(appointment_fk_field.isnot(None), appointment_rating_field.isnot(None))
+        .group_by(appointment_fk_field)
+        .all()
+    )
+
+    db.session.query(target_model).update(
+        {"rating_sum": 0, "rating_count": 0, "average_rate": 0},
+        synchronize_session=False
+    )
+    for target_id, rating_sum, rating_count in totals:
+        db.session.query(target_model).filter(target_id_field == target_id).update(
+            {
+                "rating_sum": rating_sum,
+                "rating_count": rating_count,
+                "average_rate": round(rating_sum / rating_count, 2) if rating_count else 0
+            },
+            synchronize_session=False
+        )
+    return len(totals)
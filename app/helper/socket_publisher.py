@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import deque
+from flask import current_app
+from ..extension import socketio
+from .async_mode import blocking_get, thread_queue
+
+
+class InlinePublisher:
+    """
+    Emits straight away on the calling thread. With no SOCKETIO_MESSAGE_QUEUE this is a
+    loopback to the local server; the last frames are kept in sent for tests to inspect.
+    Under eventlet it only works from the server's own greenthreads.
+    """
+
+    def __init__(self, keep=1000):
+        self.sent = deque(maxlen=keep)
+
+    def start(self):
+        pass
+
+    def publish(self, event, data, to=None):
+        self.sent.append((event, data, to))
+        socketio.emit(event, data, to=to)
+        return True
+
+    def flush(self, timeout=None):
+        return True
+
+
+class QueuedPublisher:
+    """
+    Hands emits to a background task so a request never waits on the message queue
+    (Redis/AMQP publish) or on fanning out to local clients. publish() may be called
+    from any OS thread (upload and mail workers included): the queue is a plain
+    thread-safe one, and under eventlet the task waits on it through eventlet's thread
+    pool, so the emits themselves always run on the server's hub.
+    """
+
+    def __init__(self, max_pending=10000):
+        self.max_pending = max_pending
+        self._queue = thread_queue()
+        self._started = False
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the background task. create_app() does this on the server's thread; under
+        eventlet a task started from another OS thread would sit on that thread's hub
+        and never run.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._run)
+
+    def publish(self, event, data, to=None):
+        self.start()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                print(f"Socket publish queue full, dropping {event}")
+                return False
+            self._pending += 1
+        self._queue.put((event, data, to))
+        return True
+
+    def _run(self):
+        while True:
+            event, data, to = blocking_get(self._queue)
+            try:
+                socketio.emit(event, data, to=to)
+            except Exception as e:
+                print(f"Socket emit of {event} failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+    def flush(self, timeout=None):
+        """Block until every queued emit has been sent (for scripts and tests)"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while self._pending:
+            if deadline and time.monotonic() > deadline:
+                return False
+            socketio.sleep(0.01)
+        return True
+
+
+_publishers = {}
+
+
+def get_publisher():
+    """Publisher selected by SOCKETIO_PUBLISHER, either "queued" (default) or "inline"."""
+    kind = current_app.config.get("SOCKETIO_PUBLISHER", "queued")
+    publisher = _publishers.get(kind)
+    if publisher is None:
+        if kind == "queued":
+            publisher = QueuedPublisher()
+        elif kind == "inline":
+            publisher = InlinePublisher()
+        else:
+            raise ValueError(f"Unknown socket publisher '{kind}'")
+        _publishers[kind] = publisher
+    return publisher
+
+
+def set_publisher(kind, publisher):
+    """Plug a publisher in for a SOCKETIO_PUBLISHER name (e.g. a recording one in tests)"""
+    _publishers[kind] = publisher
+
+
+def publish(event, data, to=None):
+    """False when the publisher dropped the emit"""
+    return get_publisher().publish(event, data, to=to)
@@ -0,0 +1,123 @@
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import inspect
+from ..extension import db
+
+
+class CloudinaryStorage:
+    def save(self, data, filename=None, content_type=None):
+        import cloudinary.uploader
+
+        upload_result = cloudinary.uploader.upload(io.BytesIO(data))
+        return upload_result["secure_url"]
+
+
+class LocalStorage:
+    """Writes uploads under root and serves them from base_url; meant for development and tests"""
+
+    def __init__(self, root, base_url):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def save(self, data, filename=None, content_type=None):
+        extension = os.path.splitext(filename or "")[1]
+        name = f"{uuid.uuid4().hex}{extension}"
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, name), "wb") as file:
+            file.write(data)
+        return f"{self.base_url}/{name}"
+
+
+_storages = {}
+
+
+def get_storage(app=None):
+    """Storage backend selected by UPLOAD_BACKEND ("cloudinary" or "local")"""
+    app = app or current_app
+    backend = app.config.get("UPLOAD_BACKEND", "cloudinary")
+    storage = _storages.get(backend)
+    if storage is None:
+        if backend == "local":
+            storage = LocalStorage(app.config.get("UPLOAD_LOCAL_DIR", "uploads"), app.config.get("UPLOAD_LOCAL_URL", "/uploads"))
+        elif backend == "cloudinary":
+            storage = CloudinaryStorage()
+        else:
+            raise ValueError(f"Unknown upload backend '{backend}'")
+        _storages[backend] = storage
+    return storage
+
+
+def set_storage(backend, storage):
+    """Plug a storage implementation in for a backend name"""
+    _storages[backend] = storage
+
+
+_executor = None
+_executor_lock = threading.Lock()
+# latest upload token per record, so a slow older upload can't overwrite a newer image
+_latest_uploads = {}
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get("UPLOAD_WORKERS", 4), thread_name_prefix="upload")
+        return _executor
+
+
+def _upload(app, model, key, token, data, filename, content_type, resource_name, account_id):
+    from ..socket_events import emit_image_uploaded
+
+    with app.app_context():
+        try:
+            url = get_storage(app).save(data, filename=filename, content_type=content_type)
+
+            if _latest_uploads.get((model, key)) != token:
+                return
+            instance = db.session.get(model, key)
+            if instance is None:
+                return
+            instance.image = url
+            db.session.commit()
+
+            emit_image_uploaded(resource_name, key, url, account_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Image upload for {resource_name} {key} failed: {e}")
+        finally:
+            if _latest_uploads.get((model, key)) == token:
+                _latest_uploads.pop((model, key), None)
+            db.session.remove()
+
+
+def queue_image_upload(instance, image, resource_name):
+    """
+    Upload image in the background and set instance.image when it is stored.
+    instance must already be committed; image is a werkzeug FileStorage from the request.
+    Returns "pending" for the response's image_upload field; the uploader is told
+    over its account room once the image is in place.
+    """
+    from flask_jwt_extended import get_jwt_identity
+
+    app = current_app._get_current_object()
+    model = type(instance)
+    key = inspect(instance).identity
+    key = key[0] if len(key) == 1 else key
+
+    # read now, the request stream is gone once the response is sent
+    data = image.read()
+    token = uuid.uuid4().hex
+    _latest_uploads[(model, key)] = token
+    try:
+        account_id = get_jwt_identity()
+    except RuntimeError:
+        # no JWT was checked for this request
+        account_id = None
+
+    _get_executor(app).submit(_upload, app, model, key, token, data, image.filename, image.mimetype, resource_name, account_id)
+    return "pending"
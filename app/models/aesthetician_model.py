@@ -6,6 +6,10 @@ from uuid import uuid4
 from .base_mixin import SoftDeleteMixin
 
 class Aesthetician(db.Model, SoftDeleteMixin):
+    __table_args__ = (
+        db.Index("ix_aesthetician_branch_availability", "branch_id", "availability", postgresql_where=db.text('"isDeleted" = false')),
+    )
+
     aesthetician_id = db.Column(db.String(255), primary_key=True, default=lambda:str(uuid4()))
     branch_id = db.Column(db.String(255), db.ForeignKey("branch.branch_id"), nullable=False)
     first_name = db.Column(db.String(255), nullable=False)
@@ -16,6 +20,9 @@ class Aesthetician(db.Model, SoftDeleteMixin):
     sex = db.Column(sex_enum, nullable=False)
     experience = db.Column(experience_enum, nullable=False)
     average_rate = db.Column(db.Float, nullable=True, default=None)
+    # running totals of the non-null ratings, average_rate = rating_sum / rating_count
+    rating_sum = db.Column(db.Float, nullable=False, default=0, server_default="0")
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     availability = db.Column(availability_enum, nullable=False)
     isDeleted = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
@@ -0,0 +1,58 @@
+from ..extension import db
+
+
+class AppointmentDailyFact(db.Model):
+    """
+    Pre-aggregated appointments per day x branch x service x aesthetician x category
+    x payment method x status. Maintained from the appointment write path by
+    helper/analytics_facts.py; soft-deleted appointments are not counted.
+    """
+    __tablename__ = "appointment_daily_fact"
+    __table_args__ = (
+        db.Index("ix_appointment_daily_fact_day", "day"),
+        db.Index("ix_appointment_daily_fact_branch_status_day", "branch_id", "status", "day"),
+        db.Index("ix_appointment_daily_fact_status_day", "status", "day"),
+    )
+
+    # hash of the dimension values, one row per combination
+    fact_key = db.Column(db.String(32), primary_key=True)
+
+    # dimensions
+    day = db.Column(db.Date, nullable=False)
+    branch_id = db.Column(db.String(255), nullable=True)
+    service_id = db.Column(db.String(255), nullable=True)
+    aesthetician_id = db.Column(db.String(255), nullable=True)
+    category = db.Column(db.String(255), nullable=True)
+    payment_method = db.Column(db.String(50), nullable=True)
+    status = db.Column(db.String(50), nullable=True)
+
+    # measures
+    appointment_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)  # sum of to_pay
+    discount = db.Column(db.Float, nullable=False, default=0.0)  # sum of discount_snapshot
+    service_rating_sum = db.Column(db.Float, nullable=False, default=0.0)
+    service_rating_count = db.Column(db.Integer, nullable=False, default=0)
+    branch_rating_sum = db.Column(db.Float, nullable=False, default=0.0)
+    branch_rating_count = db.Column(db.Integer, nullable=False, default=0)
+    aesthetician_rating_sum = db.Column(db.Float, nullable=False, default=0.0)
+    aesthetician_rating_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "day": self.day.isoformat() if self.day else None,
+            "branch_id": self.branch_id,
+            "service_id": self.service_id,
+            "aesthetician_id": self.aesthetician_id,
+            "category": self.category,
+            "payment_method": self.payment_method,
+            "status": self.status,
+            "appointment_count": self.appointment_count,
+            "revenue": self.revenue,
+            "discount": self.discount,
+            "service_rating_sum": self.service_rating_sum,
+            "service_rating_count": self.service_rating_count,
+            "branch_rating_sum": self.branch_rating_sum,
+            "branch_rating_count": self.branch_rating_count,
+            "aesthetician_rating_sum": self.aesthetician_rating_sum,
+            "aesthetician_rating_count": self.aesthetician_rating_count
+        }
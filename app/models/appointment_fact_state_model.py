@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+from ..extension import db
+
+
+class AppointmentFactState(db.Model):
+    """
+    Marks appointment_daily_fact as complete: the row is written by rebuild_facts()
+    once it has loaded every appointment, the flush listener keeps it current from then on.
+    """
+    __tablename__ = "appointment_fact_state"
+
+    name = db.Column(db.String(64), primary_key=True)
+    rebuilt_at = db.Column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    fact_rows = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "rebuilt_at": self.rebuilt_at.isoformat() if self.rebuilt_at else None,
+            "fact_rows": self.fact_rows
+        }
@@ -1,12 +1,26 @@
 from app import db
 from ..helper.functions import generate_id
-from datetime import date, datetime
+from datetime import date, datetime, timezone
 from ..helper.constant import payment_method_enum, down_payment_status_enum, payment_status_enum, appointment_status_enum, discount_type_enum
-from sqlalchemy import Float
+from sqlalchemy import Float, event
+from sqlalchemy.orm import object_session
 from .base_mixin import SoftDeleteMixin
 
 
 class Appointment(db.Model, SoftDeleteMixin):
+    __table_args__ = (
+        # booking / availability: branch capacity and aesthetician overlap checks
+        db.Index("ix_appointment_branch_status_start", "branch_id", "status", "start_time", postgresql_where=db.text('"isDeleted" = false')),
+        db.Index("ix_appointment_aesthetician_status_start", "aesthetician_id", "status", "start_time", postgresql_where=db.text('"isDeleted" = false')),
+        # duplicate pending/waiting/on-process checks and customer history
+        db.Index("ix_appointment_user_service_status", "user_id", "service_id", "status", postgresql_where=db.text('"isDeleted" = false')),
+        # analytics
+        db.Index("ix_appointment_status_created_at", "status", "created_at", postgresql_where=db.text('"isDeleted" = false')),
+        db.Index("ix_appointment_created_at", "created_at"),
+        # incremental sync (/appointment/changes), includes soft-deleted rows as tombstones
+        db.Index("ix_appointment_updated_at", "updated_at", "appointment_id"),
+    )
+
     appointment_id = db.Column(db.String(255), primary_key=True, default=lambda:generate_id("APPOINTMENT"))
         
     # foreign keys
@@ -61,9 +75,11 @@ class Appointment(db.Model, SoftDeleteMixin):
     status = db.Column(appointment_status_enum, nullable=False)
    
     isDeleted = db.Column(db.Boolean, default=False)
+    # bumped on every change, lets socket clients order and apply deltas
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
     
-    created_at = db.Column(db.Date, default=date.today())
-    updated_at = db.Column(db.Date, default=date.today(), onupdate=date.today())
+    created_at = db.Column(db.Date, default=date.today)
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
     
     # relationships
@@ -113,6 +129,12 @@ class Appointment(db.Model, SoftDeleteMixin):
             "aesthetician_id": self.aesthetician_id,
             "user_id": self.user_id,
             "walk_in_id": self.walk_in_id,
+            "version": self.version,
         }
-    
 
+
+@event.listens_for(Appointment, "before_update")
+def _bump_version(mapper, connection, target):
+    # before_update also fires for objects that were only touched, skip those
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = (target.version or 0) + 1
@@ -1,11 +1,15 @@
 from app import db
 from datetime import datetime, timezone
-from bcrypt import hashpw, checkpw, gensalt
+from ..helper.passwords import hash_password, check_password, needs_rehash
 from uuid import uuid4
 from .base_mixin import SoftDeleteMixin
 
 
 class Auth(db.Model, SoftDeleteMixin):
+    __table_args__ = (
+        db.Index("ix_auth_email", "email"),
+    )
+
     account_id = db.Column(db.String(255), primary_key=True, default=lambda:str(uuid4()))
     email = db.Column(db.String(255), nullable=False)
     _password = db.Column("password", db.String(255))
@@ -27,10 +31,14 @@ class Auth(db.Model, SoftDeleteMixin):
         self._password = self._hash_password(value)
 
     def _hash_password(self, password):
-        return hashpw(password.encode("utf-8"), gensalt()).decode("utf-8")
+        return hash_password(password)
     
     def check_password(self, password):
-        return checkpw(password.encode("utf-8"), self._password.encode("utf-8"))
+        return check_password(password, self._password)
+
+    def password_needs_rehash(self):
+        """True when the stored hash was made with a different BCRYPT_ROUNDS"""
+        return needs_rehash(self._password)
 
     def to_dict(self):
         return {
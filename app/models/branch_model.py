@@ -10,6 +10,9 @@ class Branch(db.Model, SoftDeleteMixin):
     branch_name = db.Column(db.String(255), nullable=False)
     image = db.Column(db.Text, nullable=True)
     average_rate = db.Column(db.Float, nullable=True, default=None)
+    # running totals of the non-null ratings, average_rate = rating_sum / rating_count
+    rating_sum = db.Column(db.Float, nullable=False, default=0, server_default="0")
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     slot_capacity = db.Column(db.Integer, nullable=False, default=1)
     opening_time = db.Column(db.Time, nullable=False, default=time(10, 0))
     closing_time = db.Column(db.Time, nullable=False, default=time(17, 0))
@@ -3,12 +3,18 @@ from datetime import datetime, timezone
 from ..helper.functions import generate_id
 
 class OTP(db.Model):
+    __table_args__ = (
+        db.Index("ix_otp_email", "email"),
+        db.Index("ix_otp_expires_at", "expires_at"),
+    )
+
     otp_id = db.Column(db.String(), primary_key=True, default=lambda:generate_id("OTP"))
     email = db.Column(db.String(), nullable=False)
     otp_code = db.Column(db.String(6), nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     expires_at = db.Column(db.DateTime(timezone=True), nullable=False)
     is_used = db.Column(db.Boolean, default=False)
+    attempts = db.Column(db.Integer, default=0, server_default="0", nullable=False)
     
     
     def to_dict(self):
@@ -18,7 +24,8 @@ class OTP(db.Model):
             "otp_code": self.otp_code,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "expires_at": self.expires_at.isoformat() if self.expires_at else None,
-            "is_used": self.is_used
+            "is_used": self.is_used,
+            "attempts": self.attempts
         }
     
     
\ No newline at end of file
@@ -6,6 +6,10 @@ from ..helper.constant import discount_type_enum
 from .base_mixin import SoftDeleteMixin
 
 class Service(db.Model, SoftDeleteMixin):
+    __table_args__ = (
+        db.Index("ix_service_branch_category", "branch_id", "category", postgresql_where=db.text('"isDeleted" = false')),
+    )
+
     service_id = db.Column(db.String(255), primary_key=True, default=lambda:str(uuid4()))
     branch_id = db.Column(db.String(255), db.ForeignKey("branch.branch_id"), nullable=True)
     service_name = db.Column(db.String(255), nullable=False)
@@ -19,6 +23,9 @@ class Service(db.Model, SoftDeleteMixin):
     image = db.Column(db.Text, nullable=True)
     duration = db.Column(db.Integer, nullable=True)
     average_rate = db.Column(db.Float, nullable=True, default=None)
+    # running totals of the non-null ratings, average_rate = rating_sum / rating_count
+    rating_sum = db.Column(db.Float, nullable=False, default=0, server_default="0")
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
     isDeleted = db.Column(db.Boolean, default=False)
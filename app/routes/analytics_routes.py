@@ -16,11 +16,12 @@ sales_analytics_controller = SalesAnalyticsController()
 @jwt_required()
 @access_control("owner")
 def get_appointment_summary():
+    summary = summary_controller.summary()
     return jsonify({
-        "total_appointments": summary_controller.total_appointments(),
+        "total_appointments": summary.completed_appointments,
         "avarage_overall_rating": summary_controller.avarage_overall_rating(),
-        "completion_rate":summary_controller.completion_rate(),
-        "cancellation_rate":summary_controller.cancellation_rate()
+        "completion_rate": summary.completion_rate,
+        "cancellation_rate": summary.cancellation_rate
     })
 
 @analytics_bp.route(rule="/appointments-overtime", methods=["GET"])
@@ -43,11 +44,12 @@ def get_revenue_overtime():
 @jwt_required()
 @access_control("owner")
 def get_sales_summary():
+    summary = summary_controller.summary()
     return jsonify({
-        "total_revenue": summary_controller.total_revenue(),
-        "average_transaction_value": summary_controller.average_transaction_value(),
-        "total_discount_given": summary_controller.total_discount_given(),
-        "cancellation_loss": summary_controller.cancellation_loss(),
+        "total_revenue": summary.total_revenue,
+        "average_transaction_value": summary.average_transaction_value,
+        "total_discount_given": summary.total_discount_given,
+        "cancellation_loss": summary.cancellation_loss,
     })
 
 
@@ -59,3 +59,27 @@ def get_reviews():
 @jwt_required()
 def get_available_slots():
     return appointment_controller.get_available_slots()
+
+@appointment_bp.route("/available-calendar", methods=["GET"])
+@jwt_required()
+def get_available_calendar():
+    return appointment_controller.get_available_calendar()
+
+# appointments changed since a watermark, for incremental sync
+@appointment_bp.route("/changes", methods=["GET"])
+@jwt_required()
+@access_control("admin", "owner")
+def get_appointment_changes():
+    return appointment_controller.get_changes()
+
+@appointment_bp.route("/events/metrics", methods=["GET"])
+@jwt_required()
+@access_control("owner")
+def get_event_metrics():
+    from ..socket_events import get_coalescer
+
+    coalescer = get_coalescer()
+    return jsonify({
+        "status": True,
+        "metrics": coalescer.metrics() if coalescer else None
+    }), 200
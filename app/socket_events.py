@@ -1,10 +1,89 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from flask import current_app
 from flask_socketio import emit, join_room, leave_room
+from flask_jwt_extended import decode_token, get_jwt_identity, verify_jwt_in_request
 from .extension import socketio
+from .helper.socket_publisher import get_publisher, publish
+from .helper.cache import get_cache
+
+# owners watching every branch; admins only ever join their own branch's rooms
+ALL_BRANCHES_ROOM = 'appointments'
+
+
+def branch_room(branch_id, day=None):
+    """Room of a branch's appointments, or of one day (YYYY-MM-DD) of them"""
+    room = f'branch:{branch_id}'
+    return f'{room}:{day}' if day else room
+
+
+def account_room(account_id):
+    """Room of one account's own sockets, joined on connect when the handshake has a JWT"""
+    return f'account:{account_id}'
+
+
+def _appointment_rooms(appointment_data):
+    rooms = [ALL_BRANCHES_ROOM, branch_room(appointment_data['branch_id'])]
+    if appointment_data.get('start_time'):
+        rooms.append(branch_room(appointment_data['branch_id'], appointment_data['start_time'][:10]))
+    return rooms
+
+
+def _socket_identity(data):
+    """account_id of the token sent with the event, or of the handshake's JWT cookie/header"""
+    token = data.get('token')
+    if token:
+        return decode_token(token)['sub']
+    verify_jwt_in_request()
+    return get_jwt_identity()
+
+
+def _socket_principal(data):
+    from .helper.principal import load_principal
+
+    return load_principal(_socket_identity(data))
+
+
+def _requested_room(data):
+    """
+    Room a join/leave refers to, or (None, error). Admins are pinned to their branch,
+    owners may pick any branch or all of them.
+    """
+    try:
+        principal = _socket_principal(data)
+    except Exception as e:
+        return None, f'Authentication required: {e}'
+    if not principal or principal.is_deleted:
+        return None, 'Authentication required'
+
+    if principal.role == 'admin':
+        branch_id = principal.branch_id
+        if data.get('branch_id') and data['branch_id'] != branch_id:
+            return None, 'Admins can only join their own branch'
+    elif principal.role == 'owner':
+        branch_id = data.get('branch_id')
+        if not branch_id:
+            return ALL_BRANCHES_ROOM, None
+    else:
+        return None, 'Only admins and owners can receive appointment updates'
+
+    return branch_room(branch_id, data.get('date')), None
+
 
 @socketio.on('connect')
-def handle_connect():
-    """Handle client connection"""
+def handle_connect(auth=None):
+    """
+    Handle client connection. With a JWT (cookie/header, or auth={"token"}) the client
+    joins its account room for events meant only for that account, e.g. image_uploaded.
+    """
     print('Client connected')
+    try:
+        account_id = _socket_identity(auth or {})
+    except Exception:
+        account_id = None
+    if account_id:
+        join_room(account_room(account_id))
     emit('connection_response', {'status': 'Connected to WebSocket server'})
 
 @socketio.on('disconnect')
@@ -14,44 +93,360 @@ def handle_disconnect():
 
 @socketio.on('join_appointments')
 def handle_join_appointments(data=None):
-    """Join the appointments room to receive real-time updates"""
-    room = 'appointments'
+    """
+    Join the appointments room of the caller's branch to receive real-time updates.
+    data may carry {"token", "branch_id" (owners), "date": "YYYY-MM-DD", "last_seq"};
+    with last_seq the frames missed since then are replayed as on replay_appointments.
+    """
+    room, error = _requested_room(data or {})
+    if error:
+        emit('join_error', {'message': error})
+        return
     join_room(room)
     print(f'Client joined {room} room')
-    emit('joined_room', {'room': room, 'message': 'Successfully joined appointments room'})
+    emit('joined_room', {'room': room, 'seq': current_seq(room), 'message': f'Successfully joined {room} room'})
+    if (data or {}).get('last_seq') is not None:
+        _emit_replay(room, data['last_seq'])
+
+@socketio.on('replay_appointments')
+def handle_replay_appointments(data=None):
+    """
+    Resend the frames of a joined room after data["last_seq"]. Answers with
+    appointment_replay {"room", "seq", "events": [frames]} or, when the gap is no
+    longer in the replay log, {"room", "seq", "resync": true} to refetch everything.
+    """
+    data = data or {}
+    room, error = _requested_room(data)
+    if error:
+        emit('replay_error', {'message': error})
+        return
+    _emit_replay(room, data.get('last_seq') or 0)
 
 @socketio.on('leave_appointments')
 def handle_leave_appointments(data=None):
-    """Leave the appointments room"""
-    room = 'appointments'
+    """Leave the appointments room joined with the same data"""
+    room, error = _requested_room(data or {})
+    if error:
+        emit('leave_error', {'message': error})
+        return
     leave_room(room)
     print(f'Client left {room} room')
-    emit('left_room', {'room': room, 'message': 'Successfully left appointments room'})
+    emit('left_room', {'room': room, 'message': f'Successfully left {room} room'})
+
+
+def _merge_appointment_events(previous, event, payload):
+    """
+    Fold a later event for the same appointment into the buffered one. Returns the
+    merged (event, payload), or None when the two cancel out (created then deleted).
+    """
+    previous_event, previous_payload = previous
+    if event == 'appointment_deleted':
+        return None if previous_event == 'new_appointment' else (event, payload)
+    if previous_event == 'appointment_deleted':
+        return event, payload
+
+    merged = dict(previous_payload, version=payload['version'], branch_id=payload['branch_id'])
+    if 'appointment' in payload:
+        merged['appointment'] = payload['appointment']
+        merged.pop('changes', None)
+        merged.pop('base_version', None)
+    elif 'appointment' in previous_payload:
+        merged['appointment'] = dict(previous_payload['appointment'], **payload['changes'], version=payload['version'])
+    else:
+        # base_version stays the one of the first delta, the merged changes apply on top of it
+        merged['changes'] = dict(previous_payload['changes'], **payload['changes'])
+    # an appointment created in this window is still new to the clients
+    return previous_event, merged
 
-def emit_new_appointment(appointment_data):
+
+class AppointmentReplayLog:
     """
-    Emit new appointment event to all clients in the appointments room
-    This function should be called from the appointment controller
+    Numbers every frame sent to a room with a per-room sequence and keeps the last
+    size frames of each room, so a client that reconnects with its last seq gets only
+    what it missed. Sequences come from the shared cache (one counter per room across
+    workers); the frames themselves are kept per process, so a gap that includes
+    another worker's frames is reported as needing a resync.
     """
-    socketio.emit('new_appointment', {
+
+    def __init__(self, size=500):
+        self.size = size
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _sequences(self):
+        return get_cache("socket_seq", max_entries=10000, ttl=0)
+
+    def send(self, room, event, payload, publisher):
+        """
+        Stamp payload with room and its next seq and publish it; the frame is logged
+        only once the publisher has taken it, so a replay never contains a frame that
+        was not sent. Returns the frame, or None when publishing failed.
+        """
+        sequences = self._sequences()
+        with self._lock:
+            seq = sequences.incr(room, ttl=0)
+        frame = dict(payload, room=room, seq=seq)
+
+        try:
+            accepted = publisher.publish(event, frame, to=room)
+        except Exception as e:
+            print(f"Socket publish of {event} to {room} failed: {e}")
+            accepted = False
+        if accepted is False:
+            with self._lock:
+                # hand the seq back unless a later frame already took the next one
+                if sequences.get(room) == seq:
+                    sequences.incr(room, amount=-1, ttl=0)
+            return None
+
+        with self._lock:
+            frames = self._frames.get(room)
+            if frames is None:
+                frames = self._frames[room] = deque(maxlen=self.size)
+            frames.append((seq, event, frame))
+        return frame
+
+    def current(self, room):
+        return self._sequences().get(room) or 0
+
+    def since(self, room, last_seq):
+        """[(event, frame)] sent to room after last_seq, None if some of them are no longer logged"""
+        current = self.current(room)
+        if last_seq == current:
+            return []
+        if last_seq > current:
+            # the counter was reset (e.g. a restart without a shared cache)
+            return None
+        with self._lock:
+            missed = sorted(
+                (entry for entry in self._frames.get(room, ()) if entry[0] > last_seq),
+                key=lambda entry: entry[0]
+            )
+        if len(missed) != current - last_seq or missed[0][0] != last_seq + 1:
+            return None
+        return [(event, frame) for _, event, frame in missed]
+
+
+_replay_log = None
+_replay_lock = threading.Lock()
+
+
+def get_replay_log():
+    global _replay_log
+    with _replay_lock:
+        if _replay_log is None:
+            _replay_log = AppointmentReplayLog(size=current_app.config.get("SOCKETIO_REPLAY_SIZE", 500))
+        return _replay_log
+
+
+def current_seq(room):
+    return get_replay_log().current(room)
+
+
+def _emit_replay(room, last_seq):
+    replay_log = get_replay_log()
+    try:
+        last_seq = int(last_seq)
+    except (TypeError, ValueError):
+        last_seq = 0
+    missed = replay_log.since(room, last_seq)
+    seq = replay_log.current(room)
+    if missed is None:
+        emit('appointment_replay', {'room': room, 'seq': seq, 'resync': True})
+    else:
+        events = [dict(frame, event=event) for event, frame in missed]
+        emit('appointment_replay', {'room': room, 'seq': seq, 'events': events})
+
+
+def _send_to_room(room, event, payload):
+    return get_replay_log().send(room, event, payload, get_publisher())
+
+
+class AppointmentEventCoalescer:
+    """
+    Buffers appointment events per room for window seconds, merges events of the same
+    appointment and publishes them as one appointment_events frame:
+    {"room", "seq", "events": [{"event": "appointment_updated", ...payload}, ...]}.
+    """
+
+    def __init__(self, window=0.1):
+        self.window = window
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "events_received": 0,
+            "events_sent": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0,
+        }
+
+    def add(self, event, payload, room):
+        # the flush runs in a background task, outside the request that emitted
+        app = current_app._get_current_object()
+        key = room
+        appointment_id = payload['appointment_id']
+        with self._lock:
+            self._metrics["events_received"] += 1
+            buffer = self._buffers.get(key)
+            schedule = buffer is None
+            if schedule:
+                buffer = self._buffers[key] = {"started_at": time.monotonic(), "events": OrderedDict()}
+
+            events = buffer["events"]
+            if appointment_id in events:
+                merged = _merge_appointment_events(events[appointment_id], event, payload)
+                if merged is None:
+                    del events[appointment_id]
+                else:
+                    events[appointment_id] = merged
+            else:
+                events[appointment_id] = (event, payload)
+
+        if schedule:
+            socketio.start_background_task(self._flush_later, app, key)
+
+    def _flush_later(self, app, key):
+        socketio.sleep(self.window)
+        with app.app_context():
+            self.flush(key)
+
+    def flush(self, key):
+        with self._lock:
+            buffer = self._buffers.pop(key, None)
+            if not buffer or not buffer["events"]:
+                return
+            events = [dict(payload, event=event) for event, payload in buffer["events"].values()]
+            latency = time.monotonic() - buffer["started_at"]
+            metrics = self._metrics
+            metrics["events_sent"] += len(events)
+            metrics["batches"] += 1
+            metrics["max_batch_size"] = max(metrics["max_batch_size"], len(events))
+            metrics["total_latency"] += latency
+            metrics["max_latency"] = max(metrics["max_latency"], latency)
+
+        _send_to_room(key, 'appointment_events', {'events': events})
+
+    def metrics(self):
+        """Batch size and buffering latency (seconds) since start"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            pending = sum(len(buffer["events"]) for buffer in self._buffers.values())
+        batches = metrics.pop("batches")
+        total_latency = metrics.pop("total_latency")
+        return dict(
+            metrics,
+            batches=batches,
+            pending_events=pending,
+            average_batch_size=metrics["events_sent"] / batches if batches else 0,
+            average_latency=total_latency / batches if batches else 0,
+            window=self.window,
+        )
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer():
+    """Coalescer with a SOCKETIO_COALESCE_MS window, None when coalescing is disabled (0)"""
+    global _coalescer
+    window = current_app.config.get("SOCKETIO_COALESCE_MS", 100) / 1000
+    if window <= 0:
+        return None
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = AppointmentEventCoalescer(window=window)
+        return _coalescer
+
+
+def _emit_appointment_event(event, payload, rooms):
+    """
+    Send to each room separately, each room has its own sequence; a client in more
+    than one of them can drop repeats by (appointment_id, version)
+    """
+    coalescer = get_coalescer()
+    for room in rooms:
+        if coalescer is None:
+            _send_to_room(room, event, payload)
+        else:
+            coalescer.add(event, payload, room)
+
+
+def appointment_changes(before, after):
+    """Fields of after (both Appointment.to_dict()) whose value differs from before"""
+    return {field: value for field, value in after.items() if before.get(field) != value}
+
+
+def emit_new_appointment(appointment):
+    """
+    Emit new appointment event (full snapshot) to the rooms of its branch and day
+    This function should be called from the appointment controller.
+    Appointment events are delivered in appointment_events batches, see AppointmentEventCoalescer
+    """
+    appointment_data = appointment.to_dict()
+    _emit_appointment_event('new_appointment', {
+        'appointment_id': appointment_data['appointment_id'],
+        'branch_id': appointment_data['branch_id'],
         'appointment': appointment_data,
+        'version': appointment_data['version'],
         'message': 'New appointment created'
-    }, room='appointments')
+    }, _appointment_rooms(appointment_data))
 
-def emit_appointment_updated(appointment_data):
+def emit_appointment_updated(appointment, before=None):
     """
-    Emit appointment update event to all clients in the appointments room
+    Emit only the fields that changed since before (a to_dict() taken before the update)
+    plus the new version and the base_version it applies to. Clients apply a delta only
+    when their copy is at base_version and refetch otherwise; base_version is version - 1
+    for a single update and older when the coalescer merged several deltas into one.
+    Without before, or when the appointment moved branch, the full snapshot is sent so
+    the receiving branch can add it.
     """
-    socketio.emit('appointment_updated', {
-        'appointment': appointment_data,
+    appointment_data = appointment.to_dict()
+    rooms = _appointment_rooms(appointment_data)
+    payload = {
+        'appointment_id': appointment_data['appointment_id'],
+        'branch_id': appointment_data['branch_id'],
+        'version': appointment_data['version'],
         'message': 'Appointment updated'
-    }, room='appointments')
+    }
 
-def emit_appointment_deleted(appointment_id):
+    if before is None or before['branch_id'] != appointment_data['branch_id']:
+        payload['appointment'] = appointment_data
+    else:
+        changes = appointment_changes(before, appointment_data)
+        changes.pop('version', None)
+        if not changes:
+            return
+        payload['changes'] = changes
+        payload['base_version'] = appointment_data['version'] - 1
+
+    if before is not None:
+        # the old branch/day rooms also need to see it leave
+        rooms += [room for room in _appointment_rooms(before) if room not in rooms]
+    _emit_appointment_event('appointment_updated', payload, rooms)
+
+def emit_appointment_deleted(appointment_data):
     """
-    Emit appointment deletion event to all clients in the appointments room
+    Emit appointment deletion event to the rooms of its branch and day
     """
-    socketio.emit('appointment_deleted', {
-        'appointment_id': appointment_id,
+    _emit_appointment_event('appointment_deleted', {
+        'appointment_id': appointment_data['appointment_id'],
+        'branch_id': appointment_data['branch_id'],
         'message': 'Appointment deleted'
-    }, room='appointments')
+    }, _appointment_rooms(appointment_data))
+
+def emit_image_uploaded(resource_name, resource_id, image_url, account_id):
+    """
+    Emit to the uploader's account room once a background image upload has been
+    stored and saved on its record
+    """
+    if not account_id:
+        return
+    publish('image_uploaded', {
+        'resource': resource_name,
+        'id': resource_id,
+        'image': image_url,
+        'message': 'Image uploaded'
+    }, to=account_room(account_id))
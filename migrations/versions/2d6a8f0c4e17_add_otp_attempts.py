@@ -0,0 +1,28 @@
+"""add otp attempts
+
+Revision ID: 2d6a8f0c4e17
+Revises: 9b2f4e6a1c83
+Create Date: 2026-10-18 15:12:44.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d6a8f0c4e17'
+down_revision = '9b2f4e6a1c83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('otp', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_otp_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('otp', schema=None) as batch_op:
+        batch_op.drop_index('ix_otp_expires_at')
+        batch_op.drop_column('attempts')
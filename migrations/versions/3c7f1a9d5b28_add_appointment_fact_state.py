@@ -0,0 +1,30 @@
+"""add appointment fact state
+
+Revision ID: 3c7f1a9d5b28
+Revises: 8a4c2e6b0d15
+Create Date: 2026-10-18 19:04:51.730214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7f1a9d5b28'
+down_revision = '8a4c2e6b0d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # analytics stay on the raw appointments until `flask rebuild-analytics` writes the marker
+    op.create_table('appointment_fact_state',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('rebuilt_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('fact_rows', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('appointment_fact_state')
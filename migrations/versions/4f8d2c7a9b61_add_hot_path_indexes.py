@@ -0,0 +1,43 @@
+"""add hot path indexes
+
+Revision ID: 4f8d2c7a9b61
+Revises: 1a1c17d19493
+Create Date: 2026-10-18 09:12:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8d2c7a9b61'
+down_revision = '1a1c17d19493'
+branch_labels = None
+depends_on = None
+
+
+NOT_DELETED = sa.text('"isDeleted" = false')
+
+
+def upgrade():
+    op.create_index('ix_appointment_branch_status_start', 'appointment', ['branch_id', 'status', 'start_time'], unique=False, postgresql_where=NOT_DELETED)
+    op.create_index('ix_appointment_aesthetician_status_start', 'appointment', ['aesthetician_id', 'status', 'start_time'], unique=False, postgresql_where=NOT_DELETED)
+    op.create_index('ix_appointment_user_service_status', 'appointment', ['user_id', 'service_id', 'status'], unique=False, postgresql_where=NOT_DELETED)
+    op.create_index('ix_appointment_status_created_at', 'appointment', ['status', 'created_at'], unique=False, postgresql_where=NOT_DELETED)
+    op.create_index('ix_appointment_created_at', 'appointment', ['created_at'], unique=False)
+    op.create_index('ix_service_branch_category', 'service', ['branch_id', 'category'], unique=False, postgresql_where=NOT_DELETED)
+    op.create_index('ix_aesthetician_branch_availability', 'aesthetician', ['branch_id', 'availability'], unique=False, postgresql_where=NOT_DELETED)
+    op.create_index('ix_otp_email', 'otp', ['email'], unique=False)
+    op.create_index('ix_auth_email', 'auth', ['email'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_auth_email', table_name='auth')
+    op.drop_index('ix_otp_email', table_name='otp')
+    op.drop_index('ix_aesthetician_branch_availability', table_name='aesthetician')
+    op.drop_index('ix_service_branch_category', table_name='service')
+    op.drop_index('ix_appointment_created_at', table_name='appointment')
+    op.drop_index('ix_appointment_status_created_at', table_name='appointment')
+    op.drop_index('ix_appointment_user_service_status', table_name='appointment')
+    op.drop_index('ix_appointment_aesthetician_status_start', table_name='appointment')
+    op.drop_index('ix_appointment_branch_status_start', table_name='appointment')
@@ -0,0 +1,26 @@
+"""add appointment version
+
+Revision ID: 5e1b7d3f9a02
+Revises: 2d6a8f0c4e17
+Create Date: 2026-10-18 16:05:31.840719
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1b7d3f9a02'
+down_revision = '2d6a8f0c4e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,34 @@
+"""add rating aggregates
+
+Revision ID: 7c3e91b5d2a4
+Revises: 4f8d2c7a9b61
+Create Date: 2026-10-18 11:03:27.904118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e91b5d2a4'
+down_revision = '4f8d2c7a9b61'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('branch', 'service', 'aesthetician')
+
+
+def upgrade():
+    # run `flask backfill-ratings` afterwards to fill the totals from existing reviews
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('rating_sum', sa.Float(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('rating_count')
+            batch_op.drop_column('rating_sum')
@@ -0,0 +1,39 @@
+"""appointment updated_at timestamp
+
+Revision ID: 8a4c2e6b0d15
+Revises: 5e1b7d3f9a02
+Create Date: 2026-10-18 17:22:09.361457
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4c2e6b0d15'
+down_revision = '5e1b7d3f9a02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.alter_column('updated_at',
+               existing_type=sa.Date(),
+               type_=sa.DateTime(timezone=True),
+               existing_nullable=True,
+               postgresql_using='updated_at::timestamptz')
+    # rows from before updated_at was maintained start out at their creation day
+    op.execute("UPDATE appointment SET updated_at = created_at WHERE updated_at IS NULL")
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.create_index('ix_appointment_updated_at', ['updated_at', 'appointment_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.drop_index('ix_appointment_updated_at')
+        batch_op.alter_column('updated_at',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.Date(),
+               existing_nullable=True,
+               postgresql_using='updated_at::date')
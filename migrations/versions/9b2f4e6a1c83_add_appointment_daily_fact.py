@@ -0,0 +1,50 @@
+"""add appointment daily fact
+
+Revision ID: 9b2f4e6a1c83
+Revises: 7c3e91b5d2a4
+Create Date: 2026-10-18 13:41:09.226573
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2f4e6a1c83'
+down_revision = '7c3e91b5d2a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # run `flask rebuild-analytics` afterwards to load the existing appointments
+    op.create_table('appointment_daily_fact',
+    sa.Column('fact_key', sa.String(length=32), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('branch_id', sa.String(length=255), nullable=True),
+    sa.Column('service_id', sa.String(length=255), nullable=True),
+    sa.Column('aesthetician_id', sa.String(length=255), nullable=True),
+    sa.Column('category', sa.String(length=255), nullable=True),
+    sa.Column('payment_method', sa.String(length=50), nullable=True),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    sa.Column('appointment_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('discount', sa.Float(), nullable=False),
+    sa.Column('service_rating_sum', sa.Float(), nullable=False),
+    sa.Column('service_rating_count', sa.Integer(), nullable=False),
+    sa.Column('branch_rating_sum', sa.Float(), nullable=False),
+    sa.Column('branch_rating_count', sa.Integer(), nullable=False),
+    sa.Column('aesthetician_rating_sum', sa.Float(), nullable=False),
+    sa.Column('aesthetician_rating_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('fact_key')
+    )
+    op.create_index('ix_appointment_daily_fact_day', 'appointment_daily_fact', ['day'], unique=False)
+    op.create_index('ix_appointment_daily_fact_branch_status_day', 'appointment_daily_fact', ['branch_id', 'status', 'day'], unique=False)
+    op.create_index('ix_appointment_daily_fact_status_day', 'appointment_daily_fact', ['status', 'day'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_appointment_daily_fact_status_day', table_name='appointment_daily_fact')
+    op.drop_index('ix_appointment_daily_fact_branch_status_day', table_name='appointment_daily_fact')
+    op.drop_index('ix_appointment_daily_fact_day', table_name='appointment_daily_fact')
+    op.drop_table('appointment_daily_fact')
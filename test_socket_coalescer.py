@@ -0,0 +1,54 @@
+"""
+Test script for the appointment event coalescer
+
+Sends one appointment event through the coalescer to a Socket.IO test client and
+checks it arrives as an appointment_events frame once the window has passed.
+Runs in-process, no backend server needed (DATABASE_URL must still be set).
+"""
+
+from app import create_app
+from app.extension import socketio
+from app.socket_events import branch_room, emit_appointment_deleted, get_coalescer
+
+
+def test_socket_coalescer():
+    """An event added outside a request reaches a client of its room"""
+
+    print("=" * 60)
+    print("Testing the appointment event coalescer")
+    print("=" * 60)
+
+    app = create_app()
+    app.config["SOCKETIO_PUBLISHER"] = "inline"
+    app.config["SOCKETIO_COALESCE_MS"] = 50
+
+    client = socketio.test_client(app)
+    client.get_received()
+
+    # join the branch room directly, join_appointments would need an admin/owner account
+    room = branch_room("test-branch")
+    sid = socketio.server.manager.sid_from_eio_sid(client.eio_sid, "/")
+    socketio.server.enter_room(sid, room, namespace="/")
+
+    with app.app_context():
+        coalescer = get_coalescer()
+        emit_appointment_deleted({"appointment_id": "test-appointment", "branch_id": "test-branch"})
+
+    # the flush runs in a background task after the window, outside any app context
+    socketio.sleep(coalescer.window * 5)
+
+    frames = [message for message in client.get_received() if message["name"] == "appointment_events"]
+    print(f"Received: {frames}")
+    assert len(frames) == 1, "Expected one appointment_events frame"
+
+    frame = frames[0]["args"][0]
+    assert frame["room"] == room
+    assert [event["event"] for event in frame["events"]] == ["appointment_deleted"]
+    assert frame["events"][0]["appointment_id"] == "test-appointment"
+
+    client.disconnect()
+    print("\n✓ Coalesced frame delivered")
+
+
+if __name__ == "__main__":
+    test_socket_coalescer()
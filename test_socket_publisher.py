@@ -0,0 +1,55 @@
+"""
+Test script for the queued socket publisher
+
+Publishes one event from a worker OS thread (as the image upload workers do) and
+checks a Socket.IO test client in the target room receives it.
+Runs in-process, no backend server needed (DATABASE_URL must still be set).
+"""
+
+import threading
+from app import create_app
+from app.extension import socketio
+from app.helper.socket_publisher import get_publisher
+
+
+def test_publish_from_worker_thread():
+    """An emit queued from a thread other than the server's reaches the client"""
+
+    print("=" * 60)
+    print("Testing publish from a worker thread")
+    print("=" * 60)
+
+    app = create_app()
+    app.config["SOCKETIO_PUBLISHER"] = "queued"
+
+    client = socketio.test_client(app)
+    client.get_received()
+
+    room = "account:test-account"
+    sid = socketio.server.manager.sid_from_eio_sid(client.eio_sid, "/")
+    socketio.server.enter_room(sid, room, namespace="/")
+
+    with app.app_context():
+        publisher = get_publisher()
+
+    def worker():
+        with app.app_context():
+            assert publisher.publish("image_uploaded", {"id": "test-image"}, to=room)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert publisher.flush(timeout=5), "Queued emit was never sent"
+
+    frames = [message for message in client.get_received() if message["name"] == "image_uploaded"]
+    print(f"Received: {frames}")
+    assert len(frames) == 1, "Expected one image_uploaded frame"
+    assert frames[0]["args"][0]["id"] == "test-image"
+
+    client.disconnect()
+    print("\n✓ Emit from the worker thread delivered")
+
+
+if __name__ == "__main__":
+    test_publish_from_worker_thread()